@@ -0,0 +1,156 @@
+"""
+Aggregate statistics of finished games - first mover advantage, draw rate,
+average length of games and heatmaps of the fields stones are placed on.
+
+Move history is read in chunks of games along their ids, from the packed
+moves of the games (`Game.moves`) rather than from `Move` rows, into NumPy
+arrays of the game, index, x, y and symbol of every move, which are
+aggregated with vectorized operations - Python code runs per game only to
+fetch its row. Archived games are counted as well.
+
+Computing the statistics of millions of moves takes seconds, so they are
+stored as `StatsSnapshot` rows and served from the latest one. Take new
+snapshots periodically with the `snapshot_stats` command.
+"""
+import json
+
+import numpy as np
+
+from . import archive
+from .board import BOARD_SIZE
+from .models import ArchivedGame, Game, Player, StatsSnapshot
+
+# games read at once
+CHUNK_SIZE = 5000
+
+# symbols of the moves in the arrays - of the player moving first or second
+FIRST, SECOND = 0, 1
+
+
+def to_arrays(game_ids, moves):
+    """
+    Turns moves of games into arrays of all their moves
+    :param game_ids: ids of the games
+    :param moves: moves of every game, packed with `pack_moves`
+    :return: dict of arrays `game` (id), `index`, `x`, `y` and `symbol` of
+             every move, and `lengths` of the games
+    """
+    lengths = np.fromiter((len(data) for data in moves), np.int64,
+                          len(game_ids))
+    fields = np.frombuffer(b''.join(moves), np.uint8)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index = np.arange(len(fields)) - starts
+    return {
+        'game': np.repeat(np.asarray(game_ids, np.int64), lengths),
+        'index': index,
+        'x': fields // BOARD_SIZE,
+        'y': fields % BOARD_SIZE,
+        'symbol': (index % 2).astype(np.uint8),
+        'lengths': lengths,
+    }
+
+
+class Statistics:
+    """Statistics accumulated chunk by chunk"""
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.first_wins = 0
+        self.second_wins = 0
+        self.draws = 0
+        self.heatmap = np.zeros((2, BOARD_SIZE, BOARD_SIZE), np.int64)
+
+    def add(self, arrays, first_won, draw):
+        """
+        :param arrays: arrays of the moves of finished games, see `to_arrays`
+        :param first_won: boolean array, whether the player moving first won
+                          every game
+        :param draw: boolean array, whether every game ended in a draw
+        """
+        self.games += len(arrays['lengths'])
+        self.moves += len(arrays['index'])
+        self.draws += int(draw.sum())
+        self.first_wins += int(first_won.sum())
+        self.second_wins += int((~first_won & ~draw).sum())
+        cells = (arrays['symbol'].astype(np.int64) * BOARD_SIZE + arrays['x']) \
+            * BOARD_SIZE + arrays['y']
+        self.heatmap += np.bincount(cells, minlength=self.heatmap.size) \
+            .reshape(self.heatmap.shape)
+
+    def to_dict(self):
+        games = self.games or 1
+        return {
+            'games': self.games,
+            'moves': self.moves,
+            'first_wins': self.first_wins,
+            'second_wins': self.second_wins,
+            'draws': self.draws,
+            'first_win_rate': self.first_wins / games,
+            'draw_rate': self.draws / games,
+            'average_length': self.moves / games,
+            'heatmap': {'first': self.heatmap[FIRST].tolist(),
+                        'second': self.heatmap[SECOND].tolist()},
+        }
+
+
+def _chunks(chunk_size):
+    """
+    Yields finished games, hot and archived, in chunks as (ids, packed
+    moves, whether the first player won, whether it was a draw)
+    """
+    games = Game.objects.filter(finished=True).order_by('id') \
+        .values_list('id', 'moves', 'draw')
+    pk = 0
+    while True:
+        chunk = list(games.filter(id__gt=pk)[:chunk_size])
+        if not chunk:
+            break
+        ids, moves, draws = zip(*chunk)
+        # players who moved first and won, looked up by the range of the ids
+        # rather than by a list of them
+        first_won = set(Player.objects.filter(
+            game_id__gte=ids[0], game_id__lte=ids[-1], first=True, won=True,
+        ).values_list('game_id', flat=True))
+        yield ids, moves, [pk in first_won for pk in ids], draws
+        pk = ids[-1]
+
+    games = ArchivedGame.objects.order_by('id')
+    pk = 0
+    while True:
+        chunk = list(games.filter(id__gt=pk)[:chunk_size])
+        if not chunk:
+            break
+        results = [archive.game_result(archived) for archived in chunk]
+        yield ([archived.pk for archived in chunk],
+               [moves for moves, _, _, _ in results],
+               [owner_won is not None and owner_won == owner_first
+                for _, owner_first, _, owner_won in results],
+               [draw for _, _, draw, _ in results])
+        pk = chunk[-1].pk
+
+
+def compute(chunk_size=CHUNK_SIZE):
+    """Statistics of all the finished games, as a dict"""
+    statistics = Statistics()
+    for ids, moves, first_won, draws in _chunks(chunk_size):
+        statistics.add(to_arrays(ids, moves), np.array(first_won, bool),
+                       np.array(draws, bool))
+    return statistics.to_dict()
+
+
+def snapshot(chunk_size=CHUNK_SIZE):
+    """Computes the statistics and stores them as a new snapshot"""
+    return StatsSnapshot.objects.create(data=json.dumps(compute(chunk_size)))
+
+
+def latest():
+    """
+    Latest snapshot of the statistics. Snapshots are only taken by
+    `snapshot`, as reading all the games does not belong to a request.
+    :return: dict of the statistics, with the time they were computed, None
+             if no snapshot was taken yet
+    """
+    stored = StatsSnapshot.objects.order_by('-id').first()
+    if stored is None:
+        return None
+    return dict(json.loads(stored.data), created=stored.created)
@@ -15,7 +15,12 @@ class PlayerSerializer(serializers.ModelSerializer):
 
 class GameSerializer(serializers.ModelSerializer):
     players = PlayerSerializer(many=True, source='player_set')
-    board = serializers.JSONField()
+    board = serializers.SerializerMethodField()
+    
+    def get_board(self, obj):
+        if self.context.get('compact'):
+            return obj.board.to_string()
+        return obj.board.to_list()
     
     def to_representation(self, obj):
         data = super().to_representation(obj)
@@ -34,8 +39,8 @@ class MoveSerializer(serializers.ModelSerializer):
     player = serializers.IntegerField(source='player.id')
     
     def create(self, data):
-        player = Player.objects.get(pk=self.context.get('player'))
-        game = Game.objects.get(pk=self.context.get('game'))
+        player = self.context.get('player')
+        game = self.context.get('game')
         x = data.get('x')
         y = data.get('y')
         
@@ -46,3 +51,16 @@ class MoveSerializer(serializers.ModelSerializer):
     class Meta:
         model = Move
         fields = ('id', 'player', 'timestamp', 'x', 'y')
+
+
+class LastMoveSerializer(serializers.ModelSerializer):
+    """Serializes last move of the game from its copy stored in `Game`"""
+    id = serializers.IntegerField(source='last_move_id')
+    player = serializers.IntegerField(source='last_move_player_id')
+    timestamp = serializers.DateTimeField(source='last_move_timestamp')
+    x = serializers.IntegerField(source='last_move_x')
+    y = serializers.IntegerField(source='last_move_y')
+
+    class Meta:
+        model = Game
+        fields = ('id', 'player', 'timestamp', 'x', 'y')
@@ -0,0 +1,188 @@
+"""
+Archive of finished games. Games finished and idle for a number of days are
+moved out of the hot tables - `Game`, `Player` and `Move` then hold only the
+games being played or finished recently - into a single `ArchivedGame` row
+per game, with the game and its moves as compressed JSON. `ArchivedPlayer`
+rows keep track of the users who played them.
+
+Endpoints reading a single game fall back to the archive for games not found
+in the hot tables, lists of games of a user merge both.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from . import const
+from .api.serializers import GameSerializer
+from .board import BitBoard, pack_moves
+from .models import ArchivedGame, ArchivedPlayer, Game, Move
+
+# games moved at once - SQLite allows at most 999 parameters in a query
+BATCH_SIZE = 200
+
+MOVE_FIELDS = ('id', 'player', 'timestamp', 'x', 'y')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+_timestamp = DateTimeField().to_representation
+
+
+def _compress(record):
+    return zlib.compress(json.dumps(record, separators=(',', ':')).encode())
+
+
+def _decompress(data):
+    return json.loads(zlib.decompress(bytes(data)).decode())
+
+
+def _pack_moves(moves):
+    """
+    Packs moves (id, player id, timestamp, x, y) - ids and timestamps as
+    differences to the previous move, which compress far better
+    """
+    packed = []
+    previous_pk, previous_time = 0, 0
+    for pk, player_id, timestamp, x, y in moves:
+        time = (timestamp - _EPOCH) // _MICROSECOND
+        packed.append([pk - previous_pk, player_id, time - previous_time, x, y])
+        previous_pk, previous_time = pk, time
+    return packed
+
+
+def _unpack_moves(packed):
+    """Returns moves packed with `_pack_moves` as dicts of `MOVE_FIELDS`"""
+    moves = []
+    pk = time = 0
+    for pk_difference, player_id, time_difference, x, y in packed:
+        pk += pk_difference
+        time += time_difference
+        timestamp = _timestamp(_EPOCH + time * _MICROSECOND)
+        moves.append(dict(zip(MOVE_FIELDS, (pk, player_id, timestamp, x, y))))
+    return moves
+
+
+def archive_games(games):
+    """
+    Moves given finished games, fetched `with_players`, with their players and
+    moves to the archive
+    """
+    ids = [game.pk for game in games]
+    moves = {}
+    for game_id, *move in Move.objects.filter(game_id__in=ids).order_by(
+            'game_id', 'id').values_list('game_id', 'id', 'player_id',
+                                         'timestamp', 'x', 'y'):
+        moves.setdefault(game_id, []).append(move)
+
+    # the board is rebuilt from the moves when read
+    serialized = GameSerializer(games, many=True,
+                                context={'compact': True}).data
+    archived = []
+    for game, data in zip(games, serialized):
+        data['board'] = None
+        record = {'game': data, 'owner_first': game.owner_first,
+                  'moves': _pack_moves(moves.get(game.pk, ()))}
+        archived.append(ArchivedGame(id=game.pk, version=game.version,
+                                     last_activity=game.last_activity,
+                                     data=_compress(record)))
+
+    ArchivedGame.objects.bulk_create(archived)
+    ArchivedPlayer.objects.bulk_create(
+        ArchivedPlayer(user_id=player.user_id, game_id=game.pk)
+        for game in games for player in game.player_set.all()
+    )
+    Game.objects.filter(pk__in=ids).delete()
+
+
+def archive(days=const.ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """
+    Moves games finished and idle for given number of days to the archive,
+    batch by batch - each in its own transaction, so the tables are never
+    locked for long
+    :return: generator of numbers of games archived in each batch
+    """
+    before = timezone.now() - timedelta(days=days)
+    games = Game.objects.filter(finished=True, last_activity__lt=before) \
+        .order_by('id').with_players()
+
+    pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(games.filter(id__gt=pk)[:batch_size])
+            if not batch:
+                return
+            archive_games(batch)
+        pk = batch[-1].pk
+        yield len(batch)
+
+
+def _moves(record):
+    return pack_moves((x, y) for _, _, _, x, y in record['moves'])
+
+
+def game_moves(archived):
+    """Moves of archived game packed with `pack_moves`"""
+    return _moves(_decompress(archived.data))
+
+
+def game_record(archived):
+    """Archived game serialized as by `GameSerializer`, without the board"""
+    return _decompress(archived.data)['game']
+
+
+def game_with_moves(archived):
+    """
+    :return: archived game as by `game_record` and its moves packed with
+             `pack_moves`
+    """
+    record = _decompress(archived.data)
+    return record['game'], _moves(record)
+
+
+def game_result(archived):
+    """
+    :return: moves of archived game packed with `pack_moves`, whether the
+             owner moved first, whether it ended in a draw and whether the
+             owner won - None if nobody did
+    """
+    record = _decompress(archived.data)
+    winners = [player['owner'] for player in record['game']['players']
+               if player['won']]
+    return (_moves(record), record['owner_first'], record['game']['draw'],
+            winners[0] if winners else None)
+
+
+def game_data(archived, compact=False, no_board=False):
+    """
+    Serializes archived game, fetched `with_players`, the same way as
+    `GameSerializer`
+    """
+    record = _decompress(archived.data)
+    data = record['game']
+
+    if no_board:
+        data.pop('board')
+    else:
+        board = BitBoard.from_moves(
+            _moves(record), const.OWNER if record['owner_first'] else const.GUEST
+        )
+        data['board'] = board.to_string() if compact else board.to_list()
+
+    # users may have been renamed since the game was archived
+    names = {player.user_id: player.user.username
+             for player in archived.players.all()}
+    for player in data['players']:
+        player['name'] = names.get(player['user'], player['name'])
+    return data
+
+
+def moves_data(archived):
+    """
+    Serializes moves of archived game the same way as `MoveSerializer`, the
+    last move first
+    """
+    return _unpack_moves(_decompress(archived.data)['moves'])[::-1]
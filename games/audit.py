@@ -0,0 +1,298 @@
+"""
+Audit of the integrity of games - replays the history of moves (`Move` rows)
+of every game and checks that everything derived from it agrees: the packed
+moves and the copy of the last move in `Game`, whether the game is finished
+and drawn, `Player.won`, and the statistics of the users counted from the
+results of all their games, archived ones included.
+
+Games are audited in ranges of their ids, fanned out to a pool of worker
+processes which read the games of a range themselves, so memory of a worker
+is bounded by the size of a range and the audit scales with the number of
+cores. The main process only aggregates the statistics of users, compares
+them and, when asked to, repairs the discrepancies.
+
+The history of moves is the source of truth. Moves made by the wrong player
+or on a taken field, and moves after the game was won, are reported but not
+repaired, as it would take changing the history.
+
+Repairs are conditional, so games may be played meanwhile: games and their
+players are repaired with a compare-and-swap on the audited version of the
+game, users only if their statistics still hold the audited values. Users are
+read before the games, so a user whose game finished during the audit no
+longer holds them and is skipped rather than set back. Whatever changed in the
+meantime is skipped.
+"""
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from . import archive
+from .board import BitBoard, pack_moves
+from .const import GUEST, OWNER
+from .models import ArchivedGame, Game, Move, Player
+
+User = get_user_model()
+
+# ids of games audited by a worker at once
+CHUNK_SIZE = 500
+
+# statistics of users counted from results of their games
+USER_FIELDS = ('won', 'lost', 'won_by_surrender', 'draws', 'surrendered')
+
+GAME_FIELDS = ('version', 'moves', 'owner_first', 'finished', 'draw',
+               'surrendered') + Game.LAST_MOVE_FIELDS
+# fields of a game repaired from its history
+REPAIRED_FIELDS = ('moves', 'finished', 'draw') + Game.LAST_MOVE_FIELDS
+
+Issue = namedtuple('Issue', 'kind pk field stored expected repairable')
+
+
+class Report:
+    """Discrepancies found in a range of games, and results of their users"""
+    def __init__(self):
+        self.issues = []
+        self.results = defaultdict(Counter)
+        # audited version of every game with repairable issues
+        self.versions = {}
+        # game of every player with issues
+        self.players = {}
+        self.games = 0
+
+    def issue(self, kind, pk, field, stored, expected, repairable=True):
+        self.issues.append(Issue(kind, pk, field, stored, expected, repairable))
+
+    def count_result(self, game, draw, winners, players):
+        """Counts result of the game to statistics of its players"""
+        if len(players) != 2:
+            return
+        for player, other in (players, players[::-1]):
+            results = self.results[player['user']]
+            if draw:
+                results['draws'] += 1
+            elif player['id'] in winners:
+                results['won'] += 1
+                results['won_by_surrender'] += game['surrendered']
+            elif other['id'] in winners:
+                results['lost'] += 1
+                results['surrendered'] += game['surrendered']
+
+    def merge(self, other):
+        self.issues.extend(other.issues)
+        self.versions.update(other.versions)
+        self.players.update(other.players)
+        self.games += other.games
+        for user, results in other.results.items():
+            self.results[user].update(results)
+
+
+def _replay(game, players, moves, report):
+    """
+    Replays moves of the game, reports discrepancies of the derived data
+    :param game: dict of `GAME_FIELDS` and `id`
+    :param players: dicts of players of the game
+    :param moves: dicts of moves of the game, in order
+    """
+    pk = game['id']
+    by_pk = {player['id']: player for player in players}
+    order = sorted(players, key=lambda player: player['owner'] != game['owner_first'])
+
+    bitboard = BitBoard()
+    winner = None
+    for i, move in enumerate(moves):
+        player = by_pk.get(move['player'])
+        if player is None or len(order) != 2 or player is not order[i % 2]:
+            report.issue('move', move['id'], 'player', move['player'],
+                         order[i % 2]['id'] if len(order) == 2 else None, False)
+        if not bitboard.is_free(move['x'], move['y']):
+            report.issue('move', move['id'], 'field', (move['x'], move['y']),
+                         None, False)
+        if winner is not None:
+            report.issue('move', move['id'], 'after_end', None, winner, False)
+        owner = player['owner'] if player is not None else i % 2 == 0
+        bitboard.place(move['x'], move['y'], OWNER if owner else GUEST)
+        if winner is None and bitboard.is_winning_move(move['x'], move['y']):
+            winner = move['player']
+
+    if game['surrendered']:
+        expected = {'finished': True, 'draw': False}
+        winners = {player['id'] for player in players if player['won']}
+        if len(winners) != 1:
+            report.issue('game', pk, 'winner', sorted(winners), None, False)
+    elif winner is not None:
+        expected = {'finished': True, 'draw': False}
+        winners = {winner}
+    else:
+        full = bitboard.is_full()
+        expected = {'finished': full, 'draw': full}
+        winners = set()
+
+    last = moves[-1] if moves else {}
+    expected.update(
+        moves=pack_moves((move['x'], move['y']) for move in moves),
+        moves_count=len(moves),
+        last_move_id=last.get('id'),
+        last_move_player_id=last.get('player'),
+        last_move_timestamp=last.get('timestamp'),
+        last_move_x=last.get('x'),
+        last_move_y=last.get('y'),
+    )
+    for field in REPAIRED_FIELDS:
+        if game[field] != expected[field]:
+            report.issue('game', pk, field, game[field], expected[field])
+            report.versions[pk] = game['version']
+    for player in players:
+        won = player['id'] in winners
+        if player['won'] != won:
+            report.issue('player', player['id'], 'won', player['won'], won)
+            report.players[player['id']] = pk
+            report.versions[pk] = game['version']
+
+    if expected['finished']:
+        report.count_result(game, expected['draw'], winners, players)
+
+
+def audit_games(start, stop):
+    """
+    Audits games with ids in range(start, stop)
+    :return: `Report`
+    """
+    report = Report()
+    ids = {'game_id__gte': start, 'game_id__lt': stop}
+    players = defaultdict(list)
+    for player in Player.objects.filter(**ids).order_by('id').values(
+            'id', 'game_id', 'user', 'owner', 'won'):
+        players[player['game_id']].append(player)
+    moves = defaultdict(list)
+    for move in Move.objects.filter(**ids).order_by('id').values(
+            'id', 'game_id', 'player', 'x', 'y', 'timestamp'):
+        moves[move['game_id']].append(move)
+
+    for game in Game.objects.filter(id__gte=start, id__lt=stop) \
+            .values('id', *GAME_FIELDS):
+        report.games += 1
+        _replay(game, players[game['id']], moves[game['id']], report)
+
+    # archived games have no history of moves left to replay, only their
+    # results are counted
+    for archived in ArchivedGame.objects.filter(id__gte=start, id__lt=stop):
+        report.games += 1
+        game = archive.game_record(archived)
+        winners = {player['user'] for player in game['players']
+                   if player['won']}
+        report.count_result(game, game['draw'], winners, [
+            {'id': player['user'], 'user': player['user']}
+            for player in game['players']
+        ])
+    return report
+
+
+def _audit_in_worker(start, stop):
+    """`audit_games` in a worker process, which closes its connections"""
+    try:
+        return audit_games(start, stop)
+    finally:
+        connections.close_all()
+
+
+def _ranges(chunk_size):
+    """Ranges of ids of all the games, hot and archived, by `chunk_size`"""
+    bounds = [queryset.aggregate(low=Min('id'), high=Max('id'))
+              for queryset in (Game.objects.all(), ArchivedGame.objects.all())]
+    lows = [bound['low'] for bound in bounds if bound['low'] is not None]
+    if not lows:
+        return []
+    high = max(bound['high'] for bound in bounds if bound['high'] is not None)
+    return [(start, start + chunk_size)
+            for start in range(min(lows), high + 1, chunk_size)]
+
+
+def audit(workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Audits all the games, and statistics of all the users
+    :param workers: number of worker processes, all the cores by default - 0
+                    to audit in this process
+    :return: `Report` with issues of games, players and users
+    """
+    # read before the games, see the module's docstring
+    users = User.objects.order_by('id').values_list('id', *USER_FIELDS)
+    users = [(pk, stored) for pk, *stored in users.iterator()]
+
+    ranges = _ranges(chunk_size)
+    report = Report()
+    if workers == 0:
+        for start, stop in ranges:
+            report.merge(audit_games(start, stop))
+    else:
+        # workers open their own connections, none may be inherited
+        connections.close_all()
+        with ProcessPoolExecutor(workers) as executor:
+            starts = [start for start, _ in ranges]
+            stops = [stop for _, stop in ranges]
+            for part in executor.map(_audit_in_worker, starts, stops):
+                report.merge(part)
+
+    for pk, stored in users:
+        results = report.results.get(pk, {})
+        for field, value in zip(USER_FIELDS, stored):
+            if value != results.get(field, 0):
+                report.issue('user', pk, field, value, results.get(field, 0))
+    return report
+
+
+def _repair_game(pk, version, fields, players):
+    """
+    Repairs given fields and players of the game, if its version is still the
+    audited one and the players were not changed either - the version then
+    moves on, which also drops the game from the cache
+    :param fields: dict of the repaired fields
+    :param players: issues of the players of the game
+    :return: False if the game was changed in the meantime
+    """
+    game = Game.objects.filter(pk=pk, version=version).first()
+    if game is None:
+        return False
+    for field, value in fields.items():
+        setattr(game, field, value)
+    with transaction.atomic():
+        if game.save_if_unchanged(list(fields), 'update') and all(
+                Player.objects.filter(pk=issue.pk, won=issue.stored)
+                .update(won=issue.expected) for issue in players):
+            return True
+        transaction.set_rollback(True)
+    return False
+
+
+@transaction.atomic
+def repair(report):
+    """
+    Repairs repairable issues of given report. Games and users changed since
+    they were audited are skipped.
+    :return: list of (kind, id) of the skipped games and users
+    """
+    skipped = []
+    games = defaultdict(dict)
+    players = defaultdict(list)
+    users = defaultdict(list)
+    for issue in report.issues:
+        if not issue.repairable:
+            continue
+        if issue.kind == 'game':
+            games[issue.pk][issue.field] = issue.expected
+        elif issue.kind == 'player':
+            players[report.players[issue.pk]].append(issue)
+        elif issue.kind == 'user':
+            users[issue.pk].append(issue)
+
+    for pk in sorted(set(games) | set(players)):
+        if not _repair_game(pk, report.versions[pk], games[pk], players[pk]):
+            skipped.append(('game', pk))
+
+    for pk, issues in sorted(users.items()):
+        if not User.objects.set_statistics(
+                pk, {issue.field: issue.stored for issue in issues},
+                {issue.field: issue.expected for issue in issues}):
+            skipped.append(('user', pk))
+    return skipped
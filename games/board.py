@@ -0,0 +1,179 @@
+from .const import OWNER, GUEST
+
+BOARD_SIZE = 15
+WIN_LENGTH = 5
+
+# free field in the string representation
+FREE = '.'
+
+# Stones are kept as bits of a Python int, one row of the board per
+# `_ROW_WIDTH` bits. The extra always-empty column separates the rows, so lines
+# shifted past the edge of the board never continue on the next row.
+_ROW_WIDTH = BOARD_SIZE + 1
+
+# Bit shift moving a stone one field along each of the four lines:
+# vertical, horizontal, diagonal and anti-diagonal.
+_SHIFTS = (_ROW_WIDTH, 1, _ROW_WIDTH + 1, _ROW_WIDTH - 1)
+
+_FIELDS = BOARD_SIZE * BOARD_SIZE
+
+
+def in_bounds(x, y):
+    return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE
+
+
+def other_symbol(symbol):
+    return GUEST if symbol == OWNER else OWNER
+
+
+def pack_moves(moves):
+    """
+    Packs sequence of moves into bytes, one per move - index of its field,
+    `x * BOARD_SIZE + y`
+    """
+    return bytes(x * BOARD_SIZE + y for x, y in moves)
+
+
+def unpack_moves(data):
+    """Returns list of (x, y) moves packed with `pack_moves`"""
+    return [divmod(field, BOARD_SIZE) for field in data]
+
+
+def _bit(x, y):
+    return 1 << (x * _ROW_WIDTH + y)
+
+
+# bits of the fields, by index of the field in packed moves
+_FIELD_BITS = tuple(_bit(*divmod(field, BOARD_SIZE))
+                    for field in range(_FIELDS))
+
+
+def _popcount(stones):
+    return bin(stones).count('1')
+
+
+def _has_five_along(stones, shift):
+    pairs = stones & (stones >> shift)
+    fours = pairs & (pairs >> 2 * shift)
+    return bool(fours & (stones >> 4 * shift))
+
+
+def _lines(x, y):
+    """Bits of the four lines through (x, y), in the order of `_SHIFTS`"""
+    lines = []
+    for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        line = 0
+        for step in range(-BOARD_SIZE, BOARD_SIZE):
+            if in_bounds(x + dx * step, y + dy * step):
+                line |= _bit(x + dx * step, y + dy * step)
+        lines.append(line)
+    return tuple(lines)
+
+
+# lines through the fields, by index of the field in packed moves
+_FIELD_LINES = tuple(_lines(*divmod(field, BOARD_SIZE))
+                     for field in range(_FIELDS))
+
+
+class BitBoard:
+    """
+    Game board kept as two bitboards - one for the owner's stones and one for
+    the guest's stones.
+    """
+    __slots__ = ('owner', 'guest')
+
+    def __init__(self, owner=0, guest=0):
+        self.owner = owner
+        self.guest = guest
+
+    @classmethod
+    def from_list(cls, rows):
+        """Builds the bitboard from the nested list representation"""
+        bitboard = cls()
+        for x, row in enumerate(rows):
+            for y, symbol in enumerate(row):
+                if symbol:
+                    bitboard.place(x, y, symbol)
+        return bitboard
+
+    @classmethod
+    def from_moves(cls, data, first=OWNER):
+        """
+        Builds the bitboard by replaying moves packed with `pack_moves`
+        :param first: symbol of the player who made the first move
+        """
+        # every other move belongs to the same player
+        first_stones = second_stones = 0
+        for field in data[::2]:
+            first_stones |= _FIELD_BITS[field]
+        for field in data[1::2]:
+            second_stones |= _FIELD_BITS[field]
+        if first == OWNER:
+            return cls(first_stones, second_stones)
+        return cls(second_stones, first_stones)
+
+    @classmethod
+    def from_string(cls, string):
+        """Builds the bitboard from the string returned by `to_string`"""
+        bitboard = cls()
+        for i, symbol in enumerate(string):
+            if symbol != FREE:
+                bitboard.place(i // BOARD_SIZE, i % BOARD_SIZE, symbol)
+        return bitboard
+
+    def to_string(self):
+        """
+        Returns the board as a string of `BOARD_SIZE ** 2` symbols, field
+        (x, y) at index `x * BOARD_SIZE + y` and `FREE` for free fields
+        """
+        return ''.join(self.get(x, y) or FREE
+                       for x in range(BOARD_SIZE) for y in range(BOARD_SIZE))
+
+    def to_list(self):
+        """Returns the board in the nested list representation"""
+        return [[self.get(x, y) for y in range(BOARD_SIZE)]
+                for x in range(BOARD_SIZE)]
+
+    def get(self, x, y):
+        bit = _bit(x, y)
+        if self.owner & bit:
+            return OWNER
+        if self.guest & bit:
+            return GUEST
+        return None
+
+    def is_free(self, x, y):
+        return not (self.owner | self.guest) & _bit(x, y)
+
+    def place(self, x, y, symbol):
+        if symbol == OWNER:
+            self.owner |= _bit(x, y)
+        else:
+            self.guest |= _bit(x, y)
+
+    def count(self):
+        """Returns number of stones on the board"""
+        return _popcount(self.owner | self.guest)
+
+    def is_full(self):
+        return self.count() == _FIELDS
+
+    def is_winning_move(self, x, y):
+        """
+        Checks whether the stone placed at (x, y) completes a line of five -
+        only along the four lines through it, other stones are not looked at
+        """
+        symbol = self.get(x, y)
+        if symbol is None:
+            return False
+        stones = self.owner if symbol == OWNER else self.guest
+        return any(_has_five_along(stones & line, shift)
+                   for shift, line in zip(_SHIFTS, _FIELD_LINES[x * BOARD_SIZE + y]))
+
+    def __eq__(self, other):
+        return isinstance(other, BitBoard) and \
+            (self.owner, self.guest) == (other.owner, other.guest)
+
+    def __repr__(self):
+        return 'BitBoard(owner={:#x}, guest={:#x})'.format(self.owner,
+                                                           self.guest)
@@ -0,0 +1,150 @@
+"""
+Built-in bot - a user playing games against people, see `search`.
+
+When it is the bot's turn, after the transaction making the previous move
+commits, the move is searched in a pool of worker processes - so the search
+neither holds a request nor the GIL of the server - and made through the same
+rules as moves of people. A thread of the server waits for the search and
+makes the move; if the game was changed in the meantime, the move is dropped.
+
+A move which fails is retried after a delay doubled with every attempt. Moves
+lost anyway, e.g. by a restart of the server, are made by
+`reschedule_bot_games`.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import const, search
+from .models import Game, Move
+from .rules import MoveRules
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+_lock = threading.Lock()
+_pools = None
+
+
+def get_bot():
+    """User of the bot, created when first needed"""
+    user, _ = User.objects.get_or_create(
+        username=const.BOT_USERNAME,
+        defaults={'is_bot': True, 'password': '!'},
+    )
+    return user
+
+
+def _executors():
+    """(processes searching moves, threads waiting for them), created lazily"""
+    global _pools
+    if _pools is None:
+        with _lock:
+            if _pools is None:
+                workers = settings.GAMES_BOT_WORKERS
+                _pools = (ProcessPoolExecutor(workers),
+                          ThreadPoolExecutor(workers))
+    return _pools
+
+
+def _restart_searches(broken):
+    """Replaces the pool of processes searching moves, if it is broken"""
+    global _pools
+    with _lock:
+        if _pools is not None and _pools[0] is broken:
+            _pools = (ProcessPoolExecutor(settings.GAMES_BOT_WORKERS),
+                      _pools[1])
+    broken.shutdown(wait=False)
+
+
+def schedule(game, player):
+    """
+    Lets the bot make its move once the current transaction commits, if it is
+    the player whose turn it is
+    :param player: player whose turn it is now, with its user
+    """
+    if not player.user.is_bot or not game.started or game.finished:
+        return
+    
+    pk, version = game.pk, game.version
+    transaction.on_commit(lambda: _executors()[1].submit(_play, pk, version))
+
+
+def waiting_games():
+    """(id, version) of the started games waiting for a move of the bot"""
+    return Game.objects.filter(
+        started=True, finished=False,
+        player__pk=F('now_turn'), player__user__is_bot=True,
+    ).order_by('id').values_list('id', 'version')
+
+
+def play(pk, version):
+    """Searches and makes the move of the bot in given version of the game"""
+    game = Game.objects.filter(pk=pk, version=version).first()
+    if game is None or game.finished:
+        return
+    
+    searches = _executors()[0]
+    try:
+        (x, y), info = searches.submit(
+            search.best_move, game.moves, settings.GAMES_BOT_TIME_BUDGET
+        ).result()
+    except BrokenProcessPool:
+        # a search process died, e.g. killed for its memory
+        _restart_searches(searches)
+        raise
+    logger.debug('Bot move in game %s searched %s nodes to depth %s.',
+                 pk, info['nodes'], info['depth'])
+    
+    with transaction.atomic():
+        _Rules().play(pk, version, x, y)
+
+
+def _play(pk, version, attempt=0):
+    """`play` in a thread of the server, retried with backoff if it fails"""
+    try:
+        play(pk, version)
+    except Exception:
+        if attempt >= settings.GAMES_BOT_RETRIES:
+            logger.exception('Bot failed to move in game %s.', pk)
+            return
+        delay = settings.GAMES_BOT_RETRY_DELAY * 2 ** attempt
+        logger.warning('Bot failed to move in game %s, retrying in %s s.',
+                       pk, delay, exc_info=True)
+        timer = threading.Timer(delay, _retry, (pk, version, attempt + 1))
+        timer.daemon = True
+        timer.start()
+    finally:
+        connection.close()
+
+
+def _retry(pk, version, attempt):
+    _executors()[1].submit(_play, pk, version, attempt)
+
+
+class _Rules(MoveRules):
+    def play(self, pk, version, x, y):
+        game = Game.objects.with_players().filter(pk=pk, version=version).first()
+        if game is None:
+            return
+        
+        players = list(game.player_set.all())
+        player = next(p for p in players if p.pk == game.now_turn)
+        other = next(p for p in players if p is not player)
+        if not player.user.is_bot or not game.board.is_free(x, y):
+            return
+        
+        move = Move.objects.create(player=player, game=game, x=x, y=y)
+        if not self._save_move(game, player, other, move):
+            transaction.set_rollback(True)
+            return
+        
+        if game.finished:
+            self._update_statistics(game, player, other)
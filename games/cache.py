@@ -0,0 +1,109 @@
+"""
+Read-through cache of serialized game and user payloads, kept in the cache
+set with the `GAMES_CACHE` setting.
+
+Games are cached under their version, which changes with every write, so a
+payload of an older state of the game is never served. Users and positions of
+the opening book have no version, their payloads are deleted once a change of
+their statistics is committed.
+"""
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_stats = Counter()
+_stats_lock = Lock()
+
+
+def get_cache():
+    return caches[settings.GAMES_CACHE]
+
+
+def game_key(pk, version, compact=False):
+    return 'game:{}:{}:{}'.format(pk, version, int(compact))
+
+
+def user_key(pk):
+    return 'user:{}'.format(pk)
+
+
+def opening_key(position):
+    return 'opening:{}'.format(position)
+
+
+def _count(kind, hit):
+    with _stats_lock:
+        _stats[kind, 'hits' if hit else 'misses'] += 1
+
+
+def get(kind, key):
+    """
+    :param kind: kind of the payload, for the hit and miss counters
+    :return: cached payload, None if there is none
+    """
+    payload = get_cache().get(key)
+    _count(kind, payload is not None)
+    return payload
+
+
+def set(key, payload):
+    get_cache().set(key, payload, settings.GAMES_CACHE_TIMEOUT)
+
+
+def get_or_build(kind, key, build):
+    """
+    Returns cached payload, or builds it with `build` and caches it
+    """
+    payload = get(kind, key)
+    if payload is None:
+        payload = build()
+        set(key, payload)
+    return payload
+
+
+def invalidate_games(versions):
+    """
+    Deletes cached payloads of games, once the current transaction commits
+    :param versions: iterable of (id, version) of the games
+    """
+    keys = [game_key(pk, version, compact)
+            for pk, version in versions for compact in (False, True)]
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def invalidate_users(*pks):
+    """
+    Deletes cached payloads of users, once the current transaction commits
+    """
+    keys = [user_key(pk) for pk in pks]
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def invalidate_openings(positions):
+    """
+    Deletes cached moves played in positions of the opening book, once the
+    current transaction commits
+    :param positions: iterable of canonical hashes of the positions
+    """
+    keys = [opening_key(position) for position in positions]
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def stats():
+    """
+    Returns numbers of cache hits and misses in this process, by kind of the
+    payload, e.g. `{'game': {'hits': 10, 'misses': 2}}`
+    """
+    with _stats_lock:
+        result = {}
+        for (kind, name), count in _stats.items():
+            result.setdefault(kind, {'hits': 0, 'misses': 0})[name] = count
+        return result
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -1,10 +1,25 @@
-EMPTY_BOARD = [
-    [None for _ in range(15)] for __ in range(15)
-]
-
 OWNER = 'o'
 GUEST = 'g'
 
+# Maximum time in seconds a request may wait for a new version of the game
+LONG_POLL_TIMEOUT = 30
+
+# seconds between comments keeping idle event streams open
+EVENTS_KEEPALIVE = 15
+
+# Maximum number of games created with a single request - they are started
+# with a single UPDATE, and SQLite allows at most 999 parameters in a query
+BULK_MAX_GAMES = 300
+
+# Finished games idle for this many days are moved to the archive
+ARCHIVE_AFTER_DAYS = 30
+
+# Number of the first moves of finished games kept in the opening book
+OPENING_BOOK_DEPTH = 16
+
+# Username of the built-in bot, see `bot`
+BOT_USERNAME = 'bot'
+
 ERROR_ALREADY_JOINED = {'error': 'You are already a player in this game.'}
 ERROR_GAME_FULL = {'error': 'This game is already full.'}
 ERROR_NOT_IN_GAME = {'error': 'You are not participating in this game.'}
@@ -15,3 +30,13 @@ ERROR_GAME_NOT_ACTIVE = {'error': 'This game is not started.'}
 ERROR_NOT_TURN = {'error': "It's not your turn to move"}
 ERROR_SPOT_TAKEN = {'error': 'This spot is already taken.'}
 ERROR_INVALID_MOVE = {'error': 'Invalid move.'}
+ERROR_CONFLICT = {
+    'error': 'This game was changed in the meantime, please try again.'
+}
+ERROR_INVALID_FILTER = {'error': 'Invalid filter value.'}
+ERROR_INVALID_PAIRS = {'error': 'Invalid pairs of users.'}
+ERROR_INVALID_WINDOW = {'error': 'Invalid rating window.'}
+ERROR_NOT_QUEUED = {'error': 'You are not waiting for a game.'}
+ERROR_INVALID_WAIT = {'error': 'Invalid version or timeout to wait for.'}
+ERROR_INVALID_POSITION = {'error': 'Invalid moves or board of the position.'}
+ERROR_NO_STATS = {'error': 'No statistics were computed yet.'}
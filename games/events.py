@@ -0,0 +1,137 @@
+"""
+Publish/subscribe of changes of games, used to push them to clients waiting
+for the opponent - both long-polling requests and event streams.
+
+Events are published by `Game.save_if_unchanged` once the change is committed.
+The backend is set with the `GAMES_EVENTS_BACKEND` setting; the default
+`LocalBackend` delivers events only within the process that published them,
+so waiting requests also re-check the database every `POLL_INTERVAL` seconds.
+"""
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+POLL_INTERVAL = 1
+
+# Events kept for a subscriber which does not keep up, older are dropped
+MAX_PENDING_EVENTS = 100
+
+
+class Subscription:
+    """Events of a single game received by one subscriber"""
+    __slots__ = ('backend', 'game_id', '_events', '_condition')
+
+    def __init__(self, backend, game_id):
+        self.backend = backend
+        self.game_id = game_id
+        self._events = deque(maxlen=MAX_PENDING_EVENTS)
+        self._condition = Condition(Lock())
+
+    def put(self, event):
+        with self._condition:
+            self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout):
+        """
+        Waits for the next event
+        :param timeout: maximum time to wait, in seconds
+        :return: event dict, None if there was none before the timeout
+        """
+        with self._condition:
+            if not self._events:
+                self._condition.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBackend:
+    """In-process backend - subscribers only get events of the same process"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, game_id):
+        subscription = Subscription(self, game_id)
+        with self._lock:
+            self._subscriptions.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.game_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.game_id]
+
+    def publish(self, game_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(game_id, ()))
+
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+_backend = None
+_backend_lock = Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.GAMES_EVENTS_BACKEND)()
+    return _backend
+
+
+def subscribe(game_id):
+    """
+    Subscribes to events of the game, use as a context manager or close the
+    returned subscription when done
+    """
+    return get_backend().subscribe(game_id)
+
+
+def publish(game_id, event):
+    """
+    Sends event to all subscribers of the game
+    :param game_id: id of the game
+    :param event: dict with at least the new `version` of the game
+    """
+    get_backend().publish(game_id, event)
+
+
+def wait_for_version(game_id, version, timeout, get_version):
+    """
+    Blocks until the game gets newer than the given version or the timeout
+    passes.
+    :param game_id: id of the game
+    :param version: version of the game already known to the client
+    :param timeout: maximum time to wait, in seconds
+    :param get_version: callable returning current version of the game from
+                        the database, None if the game does not exist
+    :return: current version of the game, None if the game does not exist
+    """
+    deadline = monotonic() + timeout
+    with subscribe(game_id) as subscription:
+        while True:
+            current = get_version()
+            remaining = deadline - monotonic()
+            if current is None or current > version or remaining <= 0:
+                return current
+
+            subscription.get(min(remaining, POLL_INTERVAL))
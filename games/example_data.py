@@ -225,3 +225,5 @@ ERROR_GAME_ACTIVE = {
 }
 ERROR_NOT_TURN = {'error': "It's not your turn to move"}
 ERROR_SPOT_TAKEN = {'error': 'This spot is already taken.'}
+ERROR_GAME_NOT_ACTIVE = {'error': 'This game is not started.'}
+ERROR_INVALID_MOVE = {'error': 'Invalid move.'}
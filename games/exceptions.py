@@ -0,0 +1,20 @@
+from django.db import OperationalError
+from rest_framework import status
+from rest_framework.compat import set_rollback
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as default_handler
+
+from . import const
+
+
+def exception_handler(exc, context):
+    """
+    Handles exceptions like the default REST framework handler, and answers
+    a write refused by SQLite because another request is writing at the same
+    time ("database is locked") as a conflict, like a failed compare-and-swap
+    of the version of a game - the request may be simply retried
+    """
+    if isinstance(exc, OperationalError) and 'locked' in str(exc):
+        set_rollback()
+        return Response(const.ERROR_CONFLICT, status=status.HTTP_409_CONFLICT)
+    return default_handler(exc, context)
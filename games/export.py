@@ -0,0 +1,171 @@
+"""
+Export of finished games with their moves, for analytics and training bots.
+
+Games are read in batches along the primary key together with their packed
+moves (`Game.moves`), so `Move` rows are not touched at all and memory grows
+only by the 8 bytes of the id of every exported game. Archived games follow
+the hot ones, read in batches the same way. Those ids skip games archived
+during the export after they were exported already.
+
+Two formats are supported:
+
+- JSON lines - one object per game, with user ids of the players:
+
+      {"id": 4, "owner": 3, "guest": 7, "first": 3, "winner": 7,
+       "draw": false, "surrendered": false, "moves": [[7, 7], [0, 0], ...]}
+
+- binary - for every game a little-endian `RECORD_HEADER` (game id, user ids
+  of the owner and of the guest, `FLAG_*` bits, number of moves), followed by
+  two bytes per move - its x and y. Use `read_binary` to read it back.
+"""
+import json
+import struct
+from array import array
+from bisect import bisect_left
+
+from . import archive
+from .board import unpack_moves
+from .models import ArchivedGame, Game, Player
+
+# games read at once - SQLite allows at most 999 parameters in a query
+BATCH_SIZE = 500
+
+RECORD_HEADER = struct.Struct('<IIIBH')
+
+FLAG_OWNER_FIRST = 1
+FLAG_OWNER_WON = 2
+FLAG_GUEST_WON = 4
+FLAG_DRAW = 8
+FLAG_SURRENDERED = 16
+
+
+def _no_players():
+    return {'owner': None, 'guest': None, 'first': None, 'winner': None}
+
+
+def _add_player(game, user_id, owner, first, won):
+    game['owner' if owner else 'guest'] = user_id
+    if first:
+        game['first'] = user_id
+    if won:
+        game['winner'] = user_id
+
+
+def _players(ids):
+    """Maps ids of given games to dicts with user ids of their players"""
+    players = {pk: _no_players() for pk in ids}
+    for game_id, *player in Player.objects.filter(
+            game_id__in=ids).values_list('game_id', 'user_id', 'owner',
+                                         'first', 'won'):
+        _add_player(players[game_id], *player)
+    return players
+
+
+def _batch(games):
+    """Yields given games (id, draw, surrendered, moves) with players"""
+    players = _players([pk for pk, _, _, _ in games])
+    for pk, draw, surrendered, moves in games:
+        game = {'id': pk}
+        game.update(players[pk])
+        game.update(draw=draw, surrendered=surrendered,
+                    moves=[list(move) for move in unpack_moves(moves)])
+        yield game
+
+
+def _archived_batch(games):
+    """Yields given archived games as dicts of the JSON lines format"""
+    for archived in games:
+        record, moves = archive.game_with_moves(archived)
+        game = {'id': archived.pk}
+        game.update(_no_players())
+        for player in record['players']:
+            _add_player(game, player['user'], player['owner'],
+                        player['first'], player['won'])
+        game.update(draw=record['draw'], surrendered=record['surrendered'],
+                    moves=[list(move) for move in unpack_moves(moves)])
+        yield game
+
+
+def finished_games(batch_size=BATCH_SIZE):
+    """
+    Yields lists of finished games as dicts of the JSON lines format, batch
+    by batch in order of their ids - the hot games first, then the archived
+    ones
+    """
+    games = Game.objects.filter(finished=True).order_by('id') \
+        .values_list('id', 'draw', 'surrendered', 'moves')
+    # ids of the exported hot games, in order
+    exported = array('q')
+    batch = list(games[:batch_size])
+    while batch:
+        yield list(_batch(batch))
+        exported.extend(pk for pk, _, _, _ in batch)
+        batch = list(games.filter(id__gt=batch[-1][0])[:batch_size])
+
+    def is_exported(pk):
+        i = bisect_left(exported, pk)
+        return i < len(exported) and exported[i] == pk
+
+    archived = ArchivedGame.objects.order_by('id').only('id', 'data')
+    batch = list(archived[:batch_size])
+    while batch:
+        games = [game for game in batch if not is_exported(game.pk)]
+        if games:
+            yield list(_archived_batch(games))
+        batch = list(archived.filter(id__gt=batch[-1].pk)[:batch_size])
+
+
+def to_json_line(game):
+    return (json.dumps(game, separators=(',', ':')) + '\n').encode()
+
+
+def to_binary(game):
+    flags = 0
+    if game['first'] is not None and game['first'] == game['owner']:
+        flags |= FLAG_OWNER_FIRST
+    if game['winner'] is not None:
+        flags |= (FLAG_GUEST_WON, FLAG_OWNER_WON)[game['winner'] == game['owner']]
+    if game['draw']:
+        flags |= FLAG_DRAW
+    if game['surrendered']:
+        flags |= FLAG_SURRENDERED
+
+    header = RECORD_HEADER.pack(game['id'], game['owner'] or 0,
+                                game['guest'] or 0, flags, len(game['moves']))
+    return header + bytes(c for move in game['moves'] for c in move)
+
+
+def export(binary=False, batch_size=BATCH_SIZE):
+    """
+    Yields finished games encoded in given format, a chunk of bytes per batch
+    """
+    encode = to_binary if binary else to_json_line
+    for games in finished_games(batch_size):
+        yield b''.join(encode(game) for game in games)
+
+
+def read_binary(stream):
+    """Yields games as dicts from a file-like object of the binary format"""
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if not header:
+            return
+        pk, owner, guest, flags, moves_count = RECORD_HEADER.unpack(header)
+        data = stream.read(2 * moves_count)
+
+        owner, guest = owner or None, guest or None
+        winner = None
+        if flags & FLAG_OWNER_WON:
+            winner = owner
+        elif flags & FLAG_GUEST_WON:
+            winner = guest
+        yield {
+            'id': pk,
+            'owner': owner,
+            'guest': guest,
+            'first': owner if flags & FLAG_OWNER_FIRST else guest,
+            'winner': winner,
+            'draw': bool(flags & FLAG_DRAW),
+            'surrendered': bool(flags & FLAG_SURRENDERED),
+            'moves': [[data[i], data[i + 1]] for i in range(0, len(data), 2)],
+        }
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class MovesField(models.BinaryField):
+    """
+    Stores sequence of moves packed with `board.pack_moves`, one byte per
+    move - always read as `bytes`, never as `memoryview`
+    """
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None:
+            return value
+        return bytes(value)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value is None:
+            return value
+        return bytes(value)
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from games import archive, const
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves finished games idle for a number of days, with their players '
+        'and moves, out of the hot tables into the archive. Games are moved '
+        'in batches, each in its own transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float,
+                            default=const.ARCHIVE_AFTER_DAYS,
+                            help='Archive games idle for this many days')
+        parser.add_argument('--batch-size', type=int,
+                            default=archive.BATCH_SIZE,
+                            help='Number of games moved at once')
+
+    def handle(self, *args, **options):
+        archived = sum(archive.archive(options['days'],
+                                       options['batch_size']))
+        self.stdout.write('Archived {} games.'.format(archived))
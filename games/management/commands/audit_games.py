@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from games import audit
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays history of moves of all the games in worker processes and '
+        'reports games, players and users whose data does not agree with it. '
+        'With --repair, the data derived from the history is fixed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of worker processes, all the cores '
+                                 'by default, 0 to audit in this process')
+        parser.add_argument('--chunk-size', type=int,
+                            default=audit.CHUNK_SIZE,
+                            help='Number of ids of games audited at once')
+        parser.add_argument('--repair', action='store_true',
+                            help='Repair the discrepancies which can be '
+                                 'repaired')
+
+    def handle(self, *args, **options):
+        report = audit.audit(options['workers'], options['chunk_size'])
+        for issue in report.issues:
+            self.stdout.write(
+                '{} {} {}: stored {!r}, expected {!r}{}'.format(
+                    issue.kind, issue.pk, issue.field, issue.stored,
+                    issue.expected, '' if issue.repairable else ' (not repairable)'))
+        self.stdout.write('Audited {} games, found {} issues.'.format(
+            report.games, len(report.issues)))
+
+        if options['repair'] and report.issues:
+            skipped = audit.repair(report)
+            for kind, pk in skipped:
+                self.stdout.write('{} {} changed in the meantime, skipped'
+                                  .format(kind, pk))
+            self.stdout.write('Repaired, skipped {} games and users changed '
+                              'in the meantime.'.format(len(skipped)))
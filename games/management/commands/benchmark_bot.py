@@ -0,0 +1,38 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from games import search
+from games.board import pack_moves
+
+
+class Command(BaseCommand):
+    help = (
+        'Lets the bot search moves of a game played against itself and '
+        'reports the depth reached and the nodes searched per second within '
+        'the time budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--moves', type=int, default=20,
+                            help='Number of moves of the game')
+        parser.add_argument('--time-budget', type=float, default=0.2,
+                            help='Seconds of every search')
+
+    def handle(self, *args, **options):
+        moves = []
+        nodes, depths, elapsed = 0, [], 0.0
+        for _ in range(options['moves']):
+            start = perf_counter()
+            move, info = search.best_move(pack_moves(moves),
+                                          options['time_budget'])
+            elapsed += perf_counter() - start
+            nodes += info['nodes']
+            depths.append(info['depth'])
+            moves.append(move)
+
+        self.stdout.write(
+            '{} searches: {:.0f} nodes/s, depth min {} / median {} / max {}.'
+            .format(len(depths), nodes / elapsed, min(depths),
+                    sorted(depths)[len(depths) // 2], max(depths))
+        )
@@ -0,0 +1,87 @@
+from random import shuffle
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from games import board, const
+from games.board import BitBoard
+from games.views import GameBulk, GameMovesBulk
+
+
+def random_game():
+    """Moves of a random game, played until somebody wins or the board fills"""
+    fields = [(x, y) for x in range(board.BOARD_SIZE)
+              for y in range(board.BOARD_SIZE)]
+    shuffle(fields)
+
+    bitboard = BitBoard()
+    moves = []
+    for i, (x, y) in enumerate(fields):
+        bitboard.place(x, y, (const.OWNER, const.GUEST)[i % 2])
+        moves.append([x, y])
+        if bitboard.is_winning_move(x, y):
+            break
+    return moves
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates games with the bulk endpoint and replays random games into '
+        'them with the bulk moves endpoint, then reports the ingest rate. '
+        'Everything is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        user_model = get_user_model()
+
+        with transaction.atomic():
+            staff = user_model.objects.create_user('benchmark_staff',
+                                                   is_staff=True)
+            first = user_model.objects.create_user('benchmark_first')
+            second = user_model.objects.create_user('benchmark_second')
+
+            games = [random_game() for _ in range(options['games'])]
+            moves_count = sum(len(moves) for moves in games)
+
+            start = perf_counter()
+            game_ids = []
+            for i in range(0, len(games), const.BULK_MAX_GAMES):
+                count = min(const.BULK_MAX_GAMES, len(games) - i)
+                request = factory.post(
+                    '/api/games/bulk/',
+                    {'pairs': [[first.pk, second.pk]] * count}, format='json',
+                )
+                force_authenticate(request, user=staff)
+                game_ids += [game['id']
+                             for game in GameBulk.as_view()(request).data]
+            created = perf_counter() - start
+
+            start = perf_counter()
+            for game_id, moves in zip(game_ids, games):
+                request = factory.post(
+                    '/api/games/{}/moves/bulk/'.format(game_id),
+                    {'moves': moves}, format='json',
+                )
+                force_authenticate(request, user=staff)
+                with transaction.atomic():
+                    response = GameMovesBulk.as_view()(request, pk=game_id)
+                assert response.status_code == 200, response.data
+            replayed = perf_counter() - start
+
+            self.stdout.write('{} games created in {:.3f} s'.format(
+                len(game_ids), created))
+            self.stdout.write(
+                '{} moves replayed in {:.3f} s - {:.0f} moves/s, '
+                '{:.0f} games/s'.format(moves_count, replayed,
+                                        moves_count / replayed,
+                                        len(games) / replayed)
+            )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,85 @@
+import threading
+import tracemalloc
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from games import events
+
+
+class Command(BaseCommand):
+    help = (
+        'Opens many idle subscriptions to a game, each waited on by its own '
+        'thread like a streaming request, then reports memory used per '
+        'subscription and latencies of delivering published events to all '
+        'of them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=20,
+                            help='Number of events published')
+        parser.add_argument('--stack-size', type=int, default=256,
+                            help='Stack size of waiting threads, in KiB')
+
+    def handle(self, *args, **options):
+        count = options['subscribers']
+        threading.stack_size(options['stack_size'] * 1024)
+        backend = events.get_backend()
+
+        received = [[] for _ in range(count)]
+        ready = threading.Barrier(count + 1)
+
+        def wait(subscription, latencies):
+            with subscription:
+                ready.wait()
+                while True:
+                    event = subscription.get(events.POLL_INTERVAL)
+                    if event is None:
+                        continue
+                    if event['type'] == 'stop':
+                        return
+                    latencies.append(perf_counter() - event['published'])
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        threads = [
+            threading.Thread(target=wait,
+                             args=(backend.subscribe(0), received[i]))
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        self.stdout.write(
+            '{} idle subscribers: {:.0f} B of Python objects each, plus '
+            '{} KiB of thread stack'.format(count, used / count,
+                                            options['stack_size'])
+        )
+
+        fan_out = []
+        for version in range(options['events']):
+            start = perf_counter()
+            backend.publish(0, {'type': 'move', 'version': version,
+                                'published': start})
+            fan_out.append((perf_counter() - start) * 1000)
+        backend.publish(0, {'type': 'stop', 'version': options['events']})
+        for thread in threads:
+            thread.join()
+
+        latencies = sorted(latency * 1000
+                           for latencies in received for latency in latencies)
+        fan_out.sort()
+        self.stdout.write(
+            'publish (fan-out to all): mean {:.3f} ms, max {:.3f} ms'.format(
+                sum(fan_out) / len(fan_out), fan_out[-1])
+        )
+        self.stdout.write(
+            'delivery of {} events: p50 {:.3f} ms, p99 {:.3f} ms, '
+            'max {:.3f} ms'.format(
+                len(latencies), latencies[len(latencies) // 2],
+                latencies[int(len(latencies) * 0.99)], latencies[-1])
+        )
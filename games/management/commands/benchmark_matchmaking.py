@@ -0,0 +1,68 @@
+from random import gauss
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from games import matchmaking
+from games.models import MatchTicket
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates users entering the matchmaking queue one after another, '
+        'with thousands of them waiting, and reports latency of entering the '
+        'queue and pairing. Everything is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--waiting', type=int, default=5000,
+                            help='Number of users waiting before the '
+                                 'measurement starts')
+        parser.add_argument('--window', type=float, default=200,
+                            help='Rating window, 0 for any')
+
+    def handle(self, *args, **options):
+        window = options['window'] or None
+        user_model = get_user_model()
+
+        with transaction.atomic():
+            user_model.objects.bulk_create(
+                user_model(username='benchmark_{}'.format(i), password='!',
+                           rating=gauss(1500, 200))
+                for i in range(options['users'] + options['waiting'])
+            )
+            users = list(user_model.objects
+                         .filter(username__startswith='benchmark_')
+                         .order_by('id'))
+
+            MatchTicket.objects.bulk_create(
+                MatchTicket(user=user, rating=user.rating, window=window,
+                            bucket=matchmaking.rating_bucket(user.rating))
+                for user in users[:options['waiting']]
+            )
+
+            timings = []
+            paired = 0
+            for user in users[options['waiting']:]:
+                start = perf_counter()
+                ticket = matchmaking.enqueue(user, window)
+                paired += matchmaking.poll(ticket) is not None
+                timings.append((perf_counter() - start) * 1000)
+            timings.sort()
+
+            self.stdout.write(
+                '{} users entered the queue with {} waiting, {} paired, {} '
+                'left waiting'.format(
+                    len(timings), options['waiting'], paired,
+                    MatchTicket.objects.filter(game=None).count()))
+            self.stdout.write(
+                'enqueue and pairing: mean {:.3f} ms, p50 {:.3f} ms, '
+                'p99 {:.3f} ms'.format(
+                    sum(timings) / len(timings), timings[len(timings) // 2],
+                    timings[int(len(timings) * 0.99)])
+            )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,166 @@
+from itertools import islice
+from random import choice, randint, random
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from games.models import Game, Player, Move
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds the database with games and moves, then reports query plans '
+        'and latencies of the hot queries without and with the indexes '
+        'declared on the games models. Everything is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--moves', type=int, default=1000000)
+        parser.add_argument('--moves-per-game', type=int, default=60)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--unfinished', type=float, default=0.05,
+                            help='Fraction of games which are not finished')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Number of runs of every query')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of rows kept in memory at once')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._seed(options)
+
+            self.stdout.write('== without indexes')
+            with connection.schema_editor() as editor:
+                self._drop_indexes(editor)
+            self._report(options['repeat'])
+
+            self.stdout.write('== with indexes')
+            with connection.schema_editor() as editor:
+                self._create_indexes(editor)
+            self._report(options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def _bulk_create(self, model, objs):
+        objs = iter(objs)
+        chunk = list(islice(objs, self.chunk_size))
+        while chunk:
+            model.objects.bulk_create(chunk)
+            chunk = list(islice(objs, self.chunk_size))
+
+    def _seed(self, options):
+        self.chunk_size = options['chunk_size']
+        user_model = get_user_model()
+        games_count = max(options['moves'] // options['moves_per_game'], 1)
+
+        self.stdout.write('Seeding {} users, {} games and {} moves...'.format(
+            options['users'], games_count, options['moves']))
+
+        self._bulk_create(
+            user_model,
+            (user_model(username='benchmark_{}'.format(i), password='!')
+             for i in range(options['users'])),
+        )
+        self.user_ids = list(
+            user_model.objects.filter(username__startswith='benchmark_')
+            .values_list('id', flat=True)
+        )
+
+        self._bulk_create(
+            Game,
+            (Game(started=True, players_count=2,
+                  finished=random() >= options['unfinished'])
+             for _ in range(games_count)),
+        )
+        self.game_ids = list(
+            Game.objects.order_by('-id').values_list('id', flat=True)
+            [:games_count]
+        )
+
+        self._bulk_create(
+            Player,
+            (Player(user_id=user_id, game_id=game_id, owner=owner)
+             for game_id in self.game_ids
+             for user_id, owner in zip(self._two_users(), (True, False))),
+        )
+        players = {}
+        for pk, game_id in Player.objects.filter(
+                game_id__gte=min(self.game_ids)).values_list('id', 'game_id'):
+            players.setdefault(game_id, []).append(pk)
+
+        moves_per_game = options['moves_per_game']
+        self._bulk_create(
+            Move,
+            (Move(game_id=game_id, player_id=players[game_id][i % 2],
+                  x=randint(0, 14), y=randint(0, 14))
+             for game_id in self.game_ids
+             for i in range(moves_per_game)),
+        )
+
+    def _two_users(self):
+        first = choice(self.user_ids)
+        second = choice(self.user_ids)
+        while second == first:
+            second = choice(self.user_ids)
+        return first, second
+
+    def _indexes(self):
+        for model in (Game, Move):
+            for index in model._meta.indexes:
+                yield model, index
+
+    def _drop_indexes(self, editor):
+        for model, index in self._indexes():
+            editor.remove_index(model, index)
+        editor.alter_unique_together(Player, Player._meta.unique_together,
+                                     [])
+
+    def _create_indexes(self, editor):
+        for model, index in self._indexes():
+            editor.add_index(model, index)
+        editor.alter_unique_together(Player, [],
+                                     Player._meta.unique_together)
+
+    def _queries(self):
+        user_id, game_id = Player.objects.filter(
+            game_id=choice(self.game_ids)).values_list('user_id', 'game_id')[0]
+
+        return (
+            ('lobby', lambda: Game.objects.filter(finished=False)
+                .order_by('id')[:50]),
+            ('last move', lambda: Move.objects.filter(
+                game_id=choice(self.game_ids))[:1]),
+            ('player in game', lambda: Player.objects.filter(
+                user_id=user_id, game_id=game_id)),
+        )
+
+    def _explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' \
+            else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+
+    def _report(self, repeat):
+        for name, query in self._queries():
+            timings = []
+            for _ in range(repeat):
+                queryset = query()
+                start = perf_counter()
+                list(queryset)
+                timings.append((perf_counter() - start) * 1000)
+            timings.sort()
+
+            self.stdout.write(
+                '{}: mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms'.format(
+                    name, sum(timings) / len(timings),
+                    timings[len(timings) // 2],
+                    timings[int(len(timings) * 0.99)],
+                )
+            )
+            for line in self._explain(query()):
+                self.stdout.write('    ' + line)
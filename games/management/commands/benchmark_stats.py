@@ -0,0 +1,65 @@
+import random
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from games import analytics
+from games.board import BOARD_SIZE
+from games.models import Game, Player
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes statistics of many finished random games and reports time '
+        'spent reading the games and aggregating their moves. Everything is '
+        'rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=200000)
+        parser.add_argument('--moves', type=int, default=50,
+                            help='Number of moves of every game')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        fields = range(BOARD_SIZE * BOARD_SIZE)
+        user_model = get_user_model()
+
+        with transaction.atomic():
+            users = [user_model.objects.create(username='benchmark_{}'.format(i),
+                                               password='!')
+                     for i in range(2)]
+            start = perf_counter()
+            Game.objects.bulk_create(
+                (Game(moves=bytes(rng.sample(fields, options['moves'])),
+                      players_count=2, started=True, finished=True)
+                 for _ in range(options['games'])),
+                batch_size=50,
+            )
+            ids = list(Game.objects.values_list('id', flat=True))
+            Player.objects.bulk_create(
+                (Player(user=users[0], game_id=pk, owner=True, first=True,
+                        won=True) for pk in ids[::2]),
+                batch_size=150,
+            )
+            self.stdout.write('Created {} games in {:.1f} s.'.format(
+                len(ids), perf_counter() - start))
+
+            start = perf_counter()
+            for _ in analytics._chunks(analytics.CHUNK_SIZE):
+                pass
+            reading = perf_counter() - start
+
+            start = perf_counter()
+            stats = analytics.compute()
+            elapsed = perf_counter() - start
+            self.stdout.write(
+                '{} moves of {} games: {:.2f} s, of which reading the games '
+                '{:.2f} s and aggregating {:.2f} s ({:.1f} M moves/s).'.format(
+                    stats['moves'], stats['games'], elapsed, reading,
+                    elapsed - reading,
+                    stats['moves'] / (elapsed - reading) / 1e6))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from games import openings
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the opening book from all the stored finished games, hot '
+        'and archived. Games are read in batches along their ids, the book '
+        'is replaced in a single transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=openings.BATCH_SIZE,
+                            help='Number of games read at once')
+
+    def handle(self, *args, **options):
+        games = openings.rebuild(options['batch_size'])
+        self.stdout.write('Built the opening book from {} games.'.format(games))
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management import BaseCommand
+
+from games import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Exports all finished games with their moves as JSON lines, or in '
+        'the compact binary format - see games.export. Games are read in '
+        'batches, so memory does not grow with the number of games.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--binary', action='store_true',
+                            help='Use the binary format')
+        parser.add_argument('--output', help='File to write to, standard '
+                                             'output by default')
+        parser.add_argument('--batch-size', type=int,
+                            default=export.BATCH_SIZE,
+                            help='Number of games read at once')
+
+    def handle(self, *args, **options):
+        chunks = export.export(options['binary'], options['batch_size'])
+        if options['output'] is None:
+            self._write(sys.stdout.buffer, chunks)
+        else:
+            with open(options['output'], 'wb') as output:
+                self._write(output, chunks)
+
+    def _write(self, output, chunks):
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from games import positions
+
+
+class Command(BaseCommand):
+    help = (
+        'Indexes positions reached in all the stored games, hot and archived, '
+        'for finding games by position. Games are read in batches along '
+        'their ids, each indexed in its own transaction; positions indexed '
+        'before are replaced, so the command can be run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=positions.BATCH_SIZE,
+                            help='Number of games indexed at once')
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for count in positions.backfill(options['batch_size']):
+            indexed += count
+            self.stdout.write('Indexed {} games.'.format(indexed))
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from games import bot
+
+
+class Command(BaseCommand):
+    help = (
+        'Makes the moves of the bot in all the started games waiting for '
+        'them, e.g. moves lost by a restart of the server. Games changed in '
+        'the meantime are left alone.'
+    )
+
+    def handle(self, *args, **options):
+        games = list(bot.waiting_games())
+        failed = 0
+        for pk, version in games:
+            try:
+                bot.play(pk, version)
+            except Exception as error:
+                failed += 1
+                self.stderr.write('Bot failed to move in game {}: {}'.format(
+                    pk, error))
+        self.stdout.write('Moved in {} of {} games waiting for the bot.'.format(
+            len(games) - failed, len(games)))
@@ -0,0 +1,22 @@
+import json
+
+from django.core.management import BaseCommand
+
+from games import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes statistics of all the finished games and stores them as a '
+        'new snapshot, served by /api/games/stats/. Run it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            default=analytics.CHUNK_SIZE,
+                            help='Number of games read at once')
+
+    def handle(self, *args, **options):
+        stored = analytics.snapshot(options['chunk_size'])
+        self.stdout.write('Took snapshot of statistics of {} games.'.format(
+            json.loads(stored.data)['games']))
@@ -0,0 +1,121 @@
+"""
+Matchmaking queue - pairs users waiting for a game, optionally of similar
+rating, and starts the game for them.
+
+Users wait as `MatchTicket` rows. A user entering the queue, or asking whether
+he was paired already, looks up the longest waiting users in his rating window
+on the bucket index and claims both tickets with a single compare-and-swap
+`UPDATE`. There are no locks - of the users racing for the same opponent one
+gets him and the others go on with the next one.
+"""
+from math import floor
+from random import choice
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Game, MatchTicket, Player
+
+# Width of the rating buckets the tickets are indexed by
+BUCKET_WIDTH = 100
+
+# Number of waiting users tried as the opponent at once
+MAX_CANDIDATES = 5
+
+
+def rating_bucket(rating):
+    return int(floor(rating / BUCKET_WIDTH))
+
+
+def enqueue(user, window=None):
+    """
+    Puts the user into the queue, or changes his rating window if he is
+    waiting already
+    :param window: maximum difference of ratings of the opponents, None for
+                   any
+    :return: ticket of the user
+    """
+    ticket, created = MatchTicket.objects.get_or_create(
+        user=user,
+        defaults={'rating': user.rating, 'bucket': rating_bucket(user.rating),
+                  'window': window},
+    )
+    if not created and ticket.game_id is None and ticket.window != window:
+        ticket.window = window
+        ticket.save(update_fields=['window'])
+    return ticket
+
+
+def _candidates(ticket):
+    """
+    Longest waiting users the ticket may be paired with - within the rating
+    windows of both of them, filtered before the waiting users are limited,
+    so users nobody fits cannot block the queue
+    """
+    tickets = MatchTicket.objects.filter(game=None).exclude(pk=ticket.pk)
+    if ticket.window is not None:
+        low, high = ticket.rating - ticket.window, ticket.rating + ticket.window
+        tickets = tickets.filter(
+            bucket__range=(rating_bucket(low), rating_bucket(high)),
+            rating__range=(low, high),
+        )
+    tickets = tickets.filter(
+        Q(window=None) |
+        Q(window__gte=F('rating') - ticket.rating) &
+        Q(window__gte=ticket.rating - F('rating'))
+    )
+    return list(tickets.order_by('id')[:MAX_CANDIDATES])
+
+
+def _start(game, owner_id, guest_id):
+    """Joins both users to the game and starts it, as `GameAction._start`"""
+    players = [Player.objects.create(user_id=owner_id, game=game, owner=True),
+               Player.objects.create(user_id=guest_id, game=game)]
+    player = choice(players)
+
+    game.started = True
+    game.now_turn = player.pk
+    game.owner_first = player.owner
+    game.save_if_unchanged(['started', 'now_turn', 'owner_first'], 'start')
+
+    player.first = True
+    player.save(update_fields=['first'])
+
+
+def match(ticket):
+    """
+    Pairs the waiting user with the longest waiting suitable one and starts a
+    game for them. Sets the game of the ticket if it was paired, also by
+    someone else in the meantime.
+    :return: True if the user was paired
+    """
+    for other in _candidates(ticket):
+        with transaction.atomic():
+            game = Game.objects.create(players_count=2)
+            claimed = MatchTicket.objects.filter(
+                pk__in=(ticket.pk, other.pk), game=None,
+            ).update(game=game)
+
+            if claimed == 2:
+                _start(game, other.user_id, ticket.user_id)
+                ticket.game = game
+                return True
+
+            transaction.set_rollback(True)
+
+        ticket.refresh_from_db(fields=['game'])
+        if ticket.game_id is not None:
+            return True
+    return False
+
+
+def poll(ticket):
+    """
+    Tries to pair the waiting user. The ticket of the paired user is dropped.
+    :return: id of the game the user was paired for, None if he still waits
+    """
+    if ticket.game_id is None and not match(ticket):
+        return None
+
+    ticket.delete()
+    return ticket.game_id
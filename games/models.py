@@ -1,13 +1,28 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 
-from jsonfield import JSONField
+from . import cache, events
+from .board import BitBoard, other_symbol, pack_moves
+from .const import GUEST, OWNER
+from .fields import MovesField
 
-from .const import EMPTY_BOARD
+
+class GameQuerySet(models.QuerySet):
+    def with_players(self):
+        """Fetches players of the games together with their users"""
+        return self.prefetch_related(
+            models.Prefetch('player_set',
+                            queryset=Player.objects.select_related('user')),
+        )
 
 
 class Game(models.Model):
-    board = JSONField(default=EMPTY_BOARD)
+    # Moves made so far packed with `pack_moves`, the board is rebuilt from
+    # them - see `board`
+    moves = MovesField(default=b'')
+    # Whether the owner made the first of `moves`, set when the game starts
+    owner_first = models.BooleanField(default=True)
     
     players_count = models.IntegerField(default=1)
     started = models.BooleanField(default=False)
@@ -16,16 +31,127 @@ class Game(models.Model):
     draw = models.BooleanField(default=False)
     
     now_turn = models.IntegerField(default=-1)
+    
+    # Bumped on every change of the game, see `save_if_unchanged`
+    version = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+    
+    # Copy of the last move, so it can be read without touching `Move`
+    moves_count = models.PositiveIntegerField(default=0)
+    last_move_id = models.IntegerField(null=True)
+    last_move_player_id = models.IntegerField(null=True)
+    last_move_timestamp = models.DateTimeField(null=True)
+    last_move_x = models.IntegerField(null=True)
+    last_move_y = models.IntegerField(null=True)
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # lobby - unfinished games ordered by id
+            models.Index(fields=['finished', 'id'], name='game_finished_id_idx'),
+            # games of a user - most recently active first
+            models.Index(fields=['last_activity', 'id'], name='game_activity_idx'),
+        ]
+
+    LAST_MOVE_FIELDS = ('moves_count', 'last_move_id', 'last_move_player_id',
+                        'last_move_timestamp', 'last_move_x', 'last_move_y')
+
+    @property
+    def board(self):
+        """
+        Board after `moves`, rebuilt when first needed and kept as long as
+        `moves` do not change
+        """
+        memo = getattr(self, '_board', None)
+        if memo is None or memo[:2] != (self.moves, self.owner_first):
+            first = OWNER if self.owner_first else GUEST
+            memo = (self.moves, self.owner_first,
+                    BitBoard.from_moves(self.moves, first))
+            self._board = memo
+        return memo[2]
+
+    def next_symbol(self):
+        """Symbol of the player whose move is next"""
+        first = OWNER if self.owner_first else GUEST
+        return first if len(self.moves) % 2 == 0 else other_symbol(first)
+
+    def place(self, x, y):
+        """
+        Makes the next move - appends it to `moves` and places its stone on
+        the board
+        :return: symbol of the placed stone
+        """
+        symbol = self.next_symbol()
+        board = self.board
+        board.place(x, y, symbol)
+        self.moves += pack_moves([(x, y)])
+        self._board = (self.moves, self.owner_first, board)
+        return symbol
+
+    def set_last_move(self, move):
+        """Records given move as the last one, see `LAST_MOVE_FIELDS`"""
+        self.moves_count += 1
+        self.last_move_id = move.pk
+        self.last_move_player_id = move.player_id
+        self.last_move_timestamp = move.timestamp
+        self.last_move_x = move.x
+        self.last_move_y = move.y
+
+    def save_if_unchanged(self, update_fields, event='update'):
+        """
+        Saves given fields only if the game was not changed by anyone else
+        since it was loaded (compare-and-swap on `version`). Once committed,
+        the change is published to subscribers of the game, see `events`,
+        and the cached payload of the previous version is dropped.
+        :param update_fields: names of the fields to save
+        :param event: type of the published event, or dict with its data
+        :return: False if the game was changed in the meantime
+        """
+        self.last_activity = timezone.now()
+        values = {name: getattr(self, name) for name in update_fields}
+        values['last_activity'] = self.last_activity
+        updated = Game.objects.filter(pk=self.pk, version=self.version).update(
+            version=models.F('version') + 1, **values
+        )
+        if updated:
+            cache.invalidate_games([(self.pk, self.version)])
+            self.version += 1
+            event = self.event(event)
+            transaction.on_commit(lambda: events.publish(self.pk, event))
+        return bool(updated)
+
+    def event(self, data):
+        """
+        Builds event describing the current state of the game - its version,
+        status and whose turn it is, without the board
+        :param data: type of the event, or dict with its data
+        """
+        if isinstance(data, str):
+            data = {'type': data}
+        return dict(
+            data,
+            version=self.version,
+            players_count=self.players_count,
+            now_turn=self.now_turn,
+            started=self.started,
+            finished=self.finished,
+            surrendered=self.surrendered,
+            draw=self.draw,
+        )
 
 
 class Player(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
-    game = models.ForeignKey(Game, default=False)
+    game = models.ForeignKey(Game)
     
     won = models.BooleanField(default=False)
     owner = models.BooleanField(default=False)
     first = models.BooleanField(default=False)
 
+    class Meta:
+        unique_together = ('user', 'game')
+
 
 class Move(models.Model):
     player = models.ForeignKey(Player)
@@ -36,4 +162,110 @@ class Move(models.Model):
     y = models.IntegerField()
     
     class Meta:
-        ordering = ('-timestamp',)
+        # moves saved at once may share the timestamp
+        ordering = ('-timestamp', '-id')
+        indexes = [
+            # moves of a game ordered by time
+            models.Index(fields=['game', 'timestamp'],
+                         name='move_game_timestamp_idx'),
+        ]
+
+
+class MatchTicket(models.Model):
+    """
+    User waiting in the matchmaking queue, see `matchmaking`. The ticket is
+    kept with the created game until the user picks the game up.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL)
+    game = models.ForeignKey(Game, null=True)
+    
+    rating = models.FloatField()
+    # maximum difference of ratings of the opponents, None for any
+    window = models.FloatField(null=True)
+    # rating rounded down to `matchmaking.BUCKET_WIDTH`, for looking up
+    # opponents of similar rating on an index
+    bucket = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # waiting users of similar rating, the longest waiting first
+            models.Index(fields=['bucket', 'id'], name='ticket_bucket_id_idx'),
+        ]
+
+
+class ArchivedGameQuerySet(models.QuerySet):
+    def with_players(self):
+        """Fetches players of the archived games together with their users"""
+        return self.prefetch_related(
+            models.Prefetch('players',
+                            queryset=ArchivedPlayer.objects.select_related('user')),
+        )
+
+
+class ArchivedGame(models.Model):
+    """
+    Finished game moved out of `Game`, `Player` and `Move` by `archive`, kept
+    as a single row with the game and its moves compressed in `data`
+    """
+    id = models.IntegerField(primary_key=True)
+    version = models.PositiveIntegerField()
+    last_activity = models.DateTimeField()
+    data = models.BinaryField()
+
+    objects = ArchivedGameQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_activity', 'id'],
+                         name='archived_activity_idx'),
+        ]
+
+
+class ArchivedPlayer(models.Model):
+    """Player of an archived game, for listing archived games of a user"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    game = models.ForeignKey(ArchivedGame, related_name='players')
+
+
+class GamePosition(models.Model):
+    """
+    Position reached in a game, by its canonical Zobrist hash, see
+    `positions`. Not a foreign key, as positions of archived games are kept.
+    """
+    hash = models.BigIntegerField()
+    game_id = models.IntegerField()
+    # number of the moves reaching the position
+    ply = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # games reaching a position, the most recent first
+            models.Index(fields=['hash', 'game_id'],
+                         name='position_hash_game_idx'),
+        ]
+
+
+class OpeningMove(models.Model):
+    """
+    Move played in a position of finished games, with their results - an edge
+    of the opening book, see `openings`
+    """
+    # canonical hash of the position, see `positions`
+    position = models.BigIntegerField()
+    # the move, in the canonical orientation of the position
+    field = models.PositiveSmallIntegerField()
+    games = models.PositiveIntegerField(default=0)
+    # games won or drawn by the player making the move
+    wins = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('position', 'field')
+
+
+class StatsSnapshot(models.Model):
+    """Statistics of finished games computed at a time, see `analytics`"""
+    created = models.DateTimeField(auto_now_add=True)
+    # the statistics as JSON
+    data = models.TextField()
@@ -0,0 +1,200 @@
+"""
+Opening book - moves played in the first `const.OPENING_BOOK_DEPTH` moves of
+finished games, how often and with what results.
+
+The book is a tree of positions: an `OpeningMove` row is an edge from a
+position, by its canonical hash (see `positions`), to the next one, with the
+move turned into the canonical orientation of the position. Positions reached
+by other orders of the moves, rotated or reflected, are thus a single node.
+Moves equal only up to a symmetry of the position itself, e.g. the second
+moves next to the stone in the center, are kept apart. Looking up a
+position needs its moves only, never the `Move` history, and the moves played
+in it are cached until the next game through it finishes.
+
+Games are added to the book when they finish - a move winning or drawing the
+game, or surrender. The `build_openings` command rebuilds the book from all
+the stored games.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from . import archive, cache, const
+from .board import BOARD_SIZE, unpack_moves
+from .models import ArchivedGame, Game, OpeningMove, Player
+from .positions import restore, symmetric_hashes, transform
+
+# games read at once - SQLite allows at most 999 parameters in a query
+BATCH_SIZE = 200
+
+# rows created by a single INSERT
+_INSERT_SIZE = 300
+
+FIRST, SECOND = 0, 1
+
+
+def _edges(moves):
+    """
+    Yields (canonical hash of the position, move in its canonical
+    orientation) of given moves, in the book
+    :param moves: list of (x, y)
+    """
+    moves = moves[:const.OPENING_BOOK_DEPTH]
+    for (x, y), symmetric in zip(moves, symmetric_hashes(moves)):
+        position = min(symmetric)
+        yield position, transform(x * BOARD_SIZE + y, symmetric.index(position))
+
+
+def _position(moves):
+    """(canonical hash, symmetry making it canonical) after given moves"""
+    *_, symmetric = symmetric_hashes(moves)
+    position = min(symmetric)
+    return position, symmetric.index(position)
+
+
+def winner_side(owner_first, owner_won):
+    """
+    :param owner_first: whether the owner of the game moved first
+    :param owner_won: whether the owner won the game, None for a draw
+    :return: `FIRST` or `SECOND` player won the game, None for a draw
+    """
+    if owner_won is None:
+        return None
+    return FIRST if owner_won == owner_first else SECOND
+
+
+def record(moves, winner):
+    """
+    Adds the finished game to the book, once the current transaction commits
+    the changed positions are dropped from the cache
+    :param moves: moves of the game packed with `pack_moves`
+    :param winner: `FIRST` or `SECOND` player won, None for a draw
+    """
+    edges = list(_edges(unpack_moves(moves)))
+    if not edges:
+        return
+
+    positions = {position for position, _ in edges}
+    existing = set(OpeningMove.objects.filter(position__in=positions)
+                   .values_list('position', 'field'))
+    missing = [OpeningMove(position=position, field=field)
+               for position, field in edges
+               if (position, field) not in existing]
+    if missing:
+        try:
+            with transaction.atomic():
+                OpeningMove.objects.bulk_create(missing)
+        except IntegrityError:
+            # created by another game finishing at the same time
+            for edge in missing:
+                try:
+                    with transaction.atomic():
+                        edge.save()
+                except IntegrityError:
+                    pass
+
+    _increment(edges, games=1, draws=int(winner is None))
+    if winner is not None:
+        _increment(edges[winner::2], wins=1)
+    cache.invalidate_openings(positions)
+
+
+def _increment(edges, **counts):
+    """Adds given counts to the given edges, with a single UPDATE"""
+    condition = reduce(or_, (Q(position=position, field=field)
+                             for position, field in edges))
+    OpeningMove.objects.filter(condition).update(
+        **{name: F(name) + count for name, count in counts.items()})
+
+
+def _moves_played(position):
+    return [list(move) for move in OpeningMove.objects.filter(
+        position=position).order_by('-games', 'field').values_list(
+        'field', 'games', 'wins', 'draws')]
+
+
+def explore(moves):
+    """
+    Moves played in the position after given moves, the most often played
+    first
+    :param moves: list of (x, y)
+    :return: list of dicts with `x`, `y` of the move, numbers of `games` it
+             was played in, and of `wins` and `draws` of the player making it
+    """
+    if len(moves) >= const.OPENING_BOOK_DEPTH:
+        return []
+
+    position, symmetry = _position(moves)
+    played = cache.get_or_build('opening', cache.opening_key(position),
+                                lambda: _moves_played(position))
+    result = []
+    for field, games, wins, draws in played:
+        x, y = divmod(restore(field, symmetry), BOARD_SIZE)
+        result.append({'x': x, 'y': y, 'games': games, 'wins': wins,
+                       'draws': draws})
+    return result
+
+
+def _results(batch_size):
+    """Yields (packed moves, winner) of all the finished games"""
+    games = Game.objects.filter(finished=True).order_by('id')
+    pk = 0
+    while True:
+        batch = list(games.filter(id__gt=pk)[:batch_size])
+        if not batch:
+            break
+        winners = dict(Player.objects.filter(
+            game__in=batch, won=True).values_list('game_id', 'owner'))
+        for game in batch:
+            owner_won = winners.get(game.pk)
+            if owner_won is not None or game.draw:
+                yield game.moves, winner_side(game.owner_first, owner_won)
+        pk = batch[-1].pk
+
+    games = ArchivedGame.objects.order_by('id')
+    pk = 0
+    while True:
+        batch = list(games.filter(id__gt=pk)[:batch_size])
+        if not batch:
+            break
+        for archived in batch:
+            moves, owner_first, draw, owner_won = archive.game_result(archived)
+            if owner_won is not None or draw:
+                yield moves, winner_side(owner_first, owner_won)
+        pk = batch[-1].pk
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """
+    Builds the book from all the stored finished games, hot and archived,
+    read in batches - replacing the book in a single transaction
+    :return: number of the games in the book
+    """
+    # (games, wins, draws) of every edge
+    counts = defaultdict(lambda: [0, 0, 0])
+    total = 0
+    for moves, winner in _results(batch_size):
+        total += 1
+        for ply, edge in enumerate(_edges(unpack_moves(moves))):
+            edge_counts = counts[edge]
+            edge_counts[0] += 1
+            if winner is None:
+                edge_counts[2] += 1
+            elif ply % 2 == winner:
+                edge_counts[1] += 1
+
+    with transaction.atomic():
+        positions = set(OpeningMove.objects.values_list('position', flat=True))
+        positions.update(position for position, _ in counts)
+        OpeningMove.objects.all().delete()
+        OpeningMove.objects.bulk_create(
+            (OpeningMove(position=position, field=field, games=games,
+                         wins=wins, draws=draws)
+             for (position, field), (games, wins, draws) in counts.items()),
+            batch_size=_INSERT_SIZE,
+        )
+        cache.invalidate_openings(positions)
+    return total
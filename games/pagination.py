@@ -0,0 +1,153 @@
+import heapq
+import json
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+class CursorLinkPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination which keeps the response body a plain list, as
+    it always was - links to the next and previous pages are sent in the
+    `Link` header instead.
+    """
+    ordering = 'id'
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_paginated_response(self, data):
+        links = [
+            '<{}>; rel="{}"'.format(link, rel)
+            for rel, link in (('next', self.get_next_link()),
+                              ('prev', self.get_previous_link()))
+            if link
+        ]
+        headers = {'Link': ', '.join(links)} if links else None
+
+        return Response(data, headers=headers)
+
+
+class RecentActivityPagination(CursorLinkPagination):
+    """Most recently changed games first"""
+    ordering = ('-last_activity', '-id')
+
+
+class KeysetPagination(CursorLinkPagination):
+    """
+    Cursor pagination keyed by all the ordering fields. `CursorPagination`
+    keys the cursor by the first of them only and skips rows sharing its value
+    by an offset, which repeats and loses rows once more than
+    `offset_cutoff` of them share it - e.g. users of the same score. Here the
+    cursor holds the values of all the fields of the row it starts after, so
+    the ordering has to be unique, e.g. end with `id`.
+    """
+    def _after(self, position, ordering):
+        """Condition of rows following the position in given ordering"""
+        conditions = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = '{}__{}'.format(name, 'lt' if field.startswith('-') else 'gt')
+            equal = {other.lstrip('-'): value
+                     for other, value in zip(ordering[:i], position)}
+            conditions.append(Q(**equal) & Q(**{lookup: position[i]}))
+        return reduce(or_, conditions)
+
+    def _position(self, instance):
+        return json.dumps([getattr(instance, field.lstrip('-'))
+                           for field in self.ordering])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(self.ordering)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        # going back, the rows before the position are read in reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field.lstrip('-') if field.startswith('-')
+                             else '-' + field for field in ordering)
+
+        if cursor is not None:
+            try:
+                position = json.loads(cursor.position)
+                if len(position) != len(ordering):
+                    raise ValueError
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self._after(position, ordering))
+
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_following = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, cursor is not None
+
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self._position(self.page[0])))
+
+
+class MergedQuerySet:
+    """
+    Rows of several querysets with the same ordering, as if they were one -
+    just enough of the `QuerySet` interface for `CursorPagination`. Every
+    slice is read from each of the querysets and merged.
+    """
+    def __init__(self, *querysets, ordering=()):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return MergedQuerySet(*[queryset.order_by(*ordering)
+                                for queryset in self.querysets],
+                              ordering=ordering)
+
+    def filter(self, **kwargs):
+        return MergedQuerySet(*[queryset.filter(**kwargs)
+                                for queryset in self.querysets],
+                              ordering=self.ordering)
+
+    def _key(self, obj):
+        return tuple(getattr(obj, field.lstrip('-')) for field in self.ordering)
+
+    def __getitem__(self, item):
+        assert isinstance(item, slice) and item.stop is not None, \
+            'Only slices with an end are supported.'
+        assert len({field.startswith('-') for field in self.ordering}) == 1, \
+            'All ordering fields have to be in the same direction.'
+
+        rows = heapq.merge(*[list(queryset[:item.stop])
+                             for queryset in self.querysets],
+                           key=self._key,
+                           reverse=self.ordering[0].startswith('-'))
+        return list(islice(rows, item.start, item.stop))
@@ -0,0 +1,196 @@
+"""
+Index of positions reached in stored games, for finding games which went
+through a given position.
+
+Every position after every move of a game is stored as a `GamePosition` row
+with its Zobrist hash - XOR of random keys of its stones. Stones are told
+apart by the order of moves (of the player moving first, or second) rather
+than by owner and guest, and the hash is canonical over the 8 symmetries of
+the board (rotations and reflections) - the smallest of the hashes of the 8
+transformed positions - so positions differing only by them are found
+together. Hashes of all the symmetries are updated with every move, so
+indexing a game takes 8 XORs per move.
+
+Positions are indexed as moves are saved, see `MoveRules._save_move`, and
+stay indexed when games are archived. Games stored before the index are
+indexed with the `index_positions` command.
+"""
+import random
+from itertools import islice
+
+from django.db import transaction
+
+from . import archive
+from .board import BOARD_SIZE, in_bounds, unpack_moves
+from .models import ArchivedGame, Game, GamePosition
+
+# games indexed at once - SQLite allows at most 999 parameters in a query
+BATCH_SIZE = 200
+
+# rows created by a single INSERT
+_INSERT_SIZE = 300
+
+_LAST = BOARD_SIZE - 1
+_TRANSFORMS = (
+    lambda x, y: (x, y),
+    lambda x, y: (y, _LAST - x),
+    lambda x, y: (_LAST - x, _LAST - y),
+    lambda x, y: (_LAST - y, x),
+    lambda x, y: (y, x),
+    lambda x, y: (_LAST - x, y),
+    lambda x, y: (_LAST - y, _LAST - x),
+    lambda x, y: (x, _LAST - y),
+)
+
+# every symmetry of the board as the list of fields each field is moved to
+_SYMMETRIC_FIELDS = [
+    [x * BOARD_SIZE + y for x, y in (symmetry(*divmod(field, BOARD_SIZE))
+                                     for field in range(BOARD_SIZE * BOARD_SIZE))]
+    for symmetry in _TRANSFORMS
+]
+_INVERSE_FIELDS = [
+    [fields.index(field) for field in range(BOARD_SIZE * BOARD_SIZE)]
+    for fields in _SYMMETRIC_FIELDS
+]
+
+_rng = random.Random(0)
+# random keys of a stone of the player moving first or second on every field,
+# 63 bits to fit a signed 64-bit column
+_KEYS = [[_rng.getrandbits(63) for _ in range(BOARD_SIZE * BOARD_SIZE)]
+         for _ in range(2)]
+# keys of every symmetry of the board, by the field before transforming it
+_SYMMETRIC_KEYS = [[[keys[field] for field in fields] for keys in _KEYS]
+                   for fields in _SYMMETRIC_FIELDS]
+
+
+def transform(field, symmetry):
+    """Field which given field is moved to by given symmetry of the board"""
+    return _SYMMETRIC_FIELDS[symmetry][field]
+
+
+def restore(field, symmetry):
+    """Field which is moved to given field by given symmetry of the board"""
+    return _INVERSE_FIELDS[symmetry][field]
+
+
+def symmetric_hashes(moves):
+    """
+    Yields hashes of all the symmetries of the position before the first and
+    after every one of given moves - the smallest of them is the canonical
+    hash, and the first symmetry giving it makes the position canonical
+    :param moves: list of (x, y)
+    """
+    symmetric = [0] * len(_SYMMETRIC_KEYS)
+    yield tuple(symmetric)
+    for ply, (x, y) in enumerate(moves):
+        field, side = x * BOARD_SIZE + y, ply % 2
+        for i, keys in enumerate(_SYMMETRIC_KEYS):
+            symmetric[i] ^= keys[side][field]
+        yield tuple(symmetric)
+
+
+def hashes(moves):
+    """
+    Yields canonical hash of the position after every one of given moves
+    :param moves: list of (x, y)
+    """
+    return (min(symmetric) for symmetric in islice(symmetric_hashes(moves), 1, None))
+
+
+def board_hashes(board):
+    """
+    Canonical hashes of the position on given board - two when both players
+    have the same number of stones, as either of them might have moved first
+    :return: list of hashes, empty if no game can reach the position
+    """
+    stones = {}
+    for x in range(BOARD_SIZE):
+        for y in range(BOARD_SIZE):
+            symbol = board.get(x, y)
+            if symbol is not None:
+                stones.setdefault(symbol, []).append((x, y))
+    counts = sorted((len(fields), symbol) for symbol, fields in stones.items())
+    if not counts:
+        return []
+    if len(counts) == 1:
+        counts.insert(0, (0, None))
+    (fewer, second), (more, first) = counts
+    if more - fewer > 1:
+        return []
+
+    orders = [(first, second)]
+    if more == fewer:
+        orders.append((second, first))
+    result = []
+    for first, second in orders:
+        moves = [None] * (more + fewer)
+        moves[::2] = stones[first]
+        moves[1::2] = stones.get(second, [])
+        *_, position = hashes(moves)
+        result.append(position)
+    return result
+
+
+def moves_hash(moves):
+    """
+    Canonical hash of the position after given moves
+    :return: the hash, None if the moves are not valid
+    """
+    if not moves or len(set(moves)) != len(moves) or \
+            not all(in_bounds(x, y) for x, y in moves):
+        return None
+    *_, position = hashes(moves)
+    return position
+
+
+def record(game_id, moves, start=0):
+    """
+    Indexes positions reached in the game after given packed moves
+    :param start: number of the moves indexed already
+    """
+    GamePosition.objects.bulk_create(
+        (GamePosition(hash=position, game_id=game_id, ply=ply)
+         for ply, position in enumerate(hashes(unpack_moves(moves)), 1)
+         if ply > start),
+        batch_size=_INSERT_SIZE,
+    )
+
+
+def _index(games):
+    """(Re)indexes positions of given (game id, packed moves)"""
+    GamePosition.objects.filter(
+        game_id__in=[pk for pk, _ in games]).delete()
+    for pk, moves in games:
+        record(pk, moves)
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """
+    Indexes positions of all the stored games, hot and archived, batch by
+    batch along their ids - each in its own transaction
+    :return: generator of numbers of games indexed in each batch
+    """
+    for queryset, moves in ((Game.objects.values_list('id', 'moves'), None),
+                            (ArchivedGame.objects.all(), archive.game_moves)):
+        queryset = queryset.order_by('id')
+        pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(queryset.filter(id__gt=pk)[:batch_size])
+                if not batch:
+                    break
+                if moves is not None:
+                    batch = [(game.pk, moves(game)) for game in batch]
+                _index(batch)
+            pk = batch[-1][0]
+            yield len(batch)
+
+
+def find(position_hashes, limit):
+    """
+    Games which reached a position with any of given hashes, the most recent
+    first
+    :return: list of (game id, number of moves reaching the position)
+    """
+    return list(GamePosition.objects.filter(hash__in=position_hashes)
+                .order_by('-game_id').values_list('game_id', 'ply')[:limit])
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+
+from . import openings, positions
+from .models import Game
+
+User = get_user_model()
+
+
+class MoveRules:
+    """Rules of making moves, shared by the views and the bot making them"""
+    # fields of the game changed by a move
+    SAVED_FIELDS = ('moves', 'now_turn', 'finished', 'draw') + Game.LAST_MOVE_FIELDS
+    
+    def _make_move(self, x, y, game, player, other):
+        game.place(x, y)
+        game.now_turn = other.pk
+    
+    def _check_winning_conditions(self, game, player, x, y):
+        # win
+        if game.board.is_winning_move(x, y):
+            player.won = True
+            game.finished = True
+            return True
+
+        # draw
+        if game.board.is_full():
+            game.finished = True
+            game.draw = True
+            return True
+                
+        return False
+    
+    def _update_statistics(self, game, player, other):
+        if game.draw:
+            User.objects.record_draw(player.user_id, other.user_id)
+            openings.record(game.moves, None)
+        else:
+            player.save(update_fields=['won'])
+            User.objects.record_win(player.user_id, other.user_id)
+            openings.record(game.moves, openings.winner_side(game.owner_first, player.owner))
+    
+    def _save_move(self, game, player, other, move):
+        """
+        Makes the created move in the game and saves the game if it was not
+        changed in the meantime, see `Game.save_if_unchanged`
+        :return: False if the game was changed in the meantime
+        """
+        self._make_move(move.x, move.y, game, player, other)
+        self._check_winning_conditions(game, player, move.x, move.y)
+        game.set_last_move(move)
+        event = {'type': 'move', 'x': move.x, 'y': move.y, 'symbol': game.board.get(move.x, move.y)}
+        if not game.save_if_unchanged(self.SAVED_FIELDS, event):
+            return False
+        
+        positions.record(game.pk, game.moves, len(game.moves) - 1)
+        return True
@@ -0,0 +1,279 @@
+"""
+Move search of the built-in bot - negamax alpha-beta search with iterative
+deepening under a time budget, and a transposition table keyed by Zobrist
+hashes of the positions.
+
+Positions are scored by windows - runs of `WIN_LENGTH` fields on a line. A
+window holding stones of a single player only is worth `WINDOW_SCORES[n]` to
+him for n of his stones, a window holding stones of both players is worth
+nothing. Numbers of stones in the windows and the score are updated as stones
+are placed and taken back, so a position is never scanned as a whole. Only
+free fields near the stones are tried as moves, those changing the score the
+most first.
+
+Everything here is plain Python without Django, to be run in worker processes.
+"""
+import random
+from time import perf_counter
+
+from .board import BOARD_SIZE, WIN_LENGTH
+
+FIELDS = BOARD_SIZE * BOARD_SIZE
+CENTER = (BOARD_SIZE // 2) * BOARD_SIZE + BOARD_SIZE // 2
+
+# score of a window for a number of stones of one player in it
+WINDOW_SCORES = (0, 1, 10, 100, 1000, 10000)
+WIN_SCORE = 1 << 30
+
+# moves tried in every position, the best ordered ones
+BEAM_WIDTH = 12
+# distance of the tried moves from the stones already placed
+NEIGHBOURHOOD = 2
+MAX_DEPTH = 20
+
+# transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# nodes searched between checks of the clock
+_CLOCK_NODES = 256
+
+
+def _windows():
+    windows = []
+    for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for x in range(BOARD_SIZE):
+            for y in range(BOARD_SIZE):
+                end_x = x + dx * (WIN_LENGTH - 1)
+                end_y = y + dy * (WIN_LENGTH - 1)
+                if 0 <= end_x < BOARD_SIZE and 0 <= end_y < BOARD_SIZE:
+                    windows.append(tuple((x + dx * i) * BOARD_SIZE + y + dy * i
+                                         for i in range(WIN_LENGTH)))
+    return windows
+
+
+_WINDOWS = _windows()
+# windows every field belongs to
+_FIELD_WINDOWS = [tuple(w for w, window in enumerate(_WINDOWS)
+                        if field in window)
+                  for field in range(FIELDS)]
+_NEIGHBOURS = [
+    tuple((x + dx) * BOARD_SIZE + y + dy
+          for dx in range(-NEIGHBOURHOOD, NEIGHBOURHOOD + 1)
+          for dy in range(-NEIGHBOURHOOD, NEIGHBOURHOOD + 1)
+          if (dx or dy) and 0 <= x + dx < BOARD_SIZE
+          and 0 <= y + dy < BOARD_SIZE)
+    for x in range(BOARD_SIZE) for y in range(BOARD_SIZE)
+]
+
+_rng = random.Random(0)
+# random keys of a stone of either player on every field
+_ZOBRIST = [[_rng.getrandbits(64) for _ in range(FIELDS)] for _ in range(2)]
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Search:
+    """
+    Position of a game and search of the best move in it. Players are `0` -
+    the one who made the first move, and `1`.
+    """
+    def __init__(self, moves=b''):
+        """
+        :param moves: moves made so far, packed with `board.pack_moves`
+        """
+        self.cells = [None] * FIELDS
+        # numbers of stones of either player in every window
+        self.counts = ([0] * len(_WINDOWS), [0] * len(_WINDOWS))
+        # number of stones near every field
+        self.near = [0] * FIELDS
+        # score of the position for the first player, and its changes made by
+        # the placed stones
+        self.score = 0
+        self.gains = []
+        self.hash = 0
+        self.side = 0
+        # transposition table - hash of a position to (depth, value, bound,
+        # best move) of its search
+        self.table = {}
+        self.deadline = None
+        self.nodes = 0
+        self.depth = 0
+
+        for field in moves:
+            self.place(field)
+
+    def place(self, field):
+        """Places stone of the player to move"""
+        side = self.side
+        self.cells[field] = side
+        own, other = self.counts[side], self.counts[1 - side]
+        gain = 0
+        for w in _FIELD_WINDOWS[field]:
+            if not other[w]:
+                gain += WINDOW_SCORES[own[w] + 1] - WINDOW_SCORES[own[w]]
+            elif not own[w]:
+                gain += WINDOW_SCORES[other[w]]
+            own[w] += 1
+        gain = gain if side == 0 else -gain
+        self.score += gain
+        self.gains.append(gain)
+        for neighbour in _NEIGHBOURS[field]:
+            self.near[neighbour] += 1
+        self.hash ^= _ZOBRIST[side][field]
+        self.side = 1 - side
+
+    def take_back(self, field):
+        """Takes back the stone placed last, at given field"""
+        side = 1 - self.side
+        self.cells[field] = None
+        counts = self.counts[side]
+        for w in _FIELD_WINDOWS[field]:
+            counts[w] -= 1
+        self.score -= self.gains.pop()
+        for neighbour in _NEIGHBOURS[field]:
+            self.near[neighbour] -= 1
+        self.hash ^= _ZOBRIST[side][field]
+        self.side = side
+
+    def evaluate(self):
+        """Score of the position for the player to move"""
+        return self.score if self.side == 0 else -self.score
+
+    def scan(self):
+        """`evaluate` from scratch, scanning all the windows"""
+        own, other = self.counts[self.side], self.counts[1 - self.side]
+        score = 0
+        for w in range(len(_WINDOWS)):
+            if not other[w]:
+                score += WINDOW_SCORES[own[w]]
+            elif not own[w]:
+                score -= WINDOW_SCORES[other[w]]
+        return score
+
+    def _gain(self, field):
+        """
+        Change of the score for the player to move made by his stone at given
+        field, None if it wins
+        """
+        own, other = self.counts[self.side], self.counts[1 - self.side]
+        gain = 0
+        for w in _FIELD_WINDOWS[field]:
+            if not other[w]:
+                stones = own[w]
+                if stones == WIN_LENGTH - 1:
+                    return None
+                gain += WINDOW_SCORES[stones + 1] - WINDOW_SCORES[stones]
+            elif not own[w]:
+                # the window is lost for the other player
+                gain += WINDOW_SCORES[other[w]]
+        return gain
+
+    def moves(self):
+        """
+        Free fields near the stones as (gain, field), the most promising
+        first - a winning move alone, with gain None
+        """
+        cells, near = self.cells, self.near
+        moves = []
+        for field in range(FIELDS):
+            if near[field] and cells[field] is None:
+                gain = self._gain(field)
+                if gain is None:
+                    return [(None, field)]
+                moves.append((gain, field))
+        moves.sort(reverse=True)
+        return moves[:BEAM_WIDTH]
+
+    def _negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes % _CLOCK_NODES and perf_counter() > self.deadline:
+            raise _Timeout
+
+        entry = self.table.get(self.hash)
+        best_field = None
+        if entry is not None:
+            entry_depth, value, bound, best_field = entry
+            if entry_depth >= depth and (
+                    bound == EXACT or
+                    (bound == LOWER and value >= beta) or
+                    (bound == UPPER and value <= alpha)):
+                return value
+
+        moves = self.moves()
+        if not moves:
+            return 0
+        if moves[0][0] is None:
+            return WIN_SCORE - ply
+        if depth == 1:
+            # the best move is the one changing the score the most
+            return self.evaluate() + moves[0][0]
+
+        if best_field is not None:
+            moves.sort(key=lambda move: move[1] != best_field)
+
+        original_alpha = alpha
+        best_value = -WIN_SCORE
+        for _, field in moves:
+            self.place(field)
+            try:
+                value = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                self.take_back(field)
+            if value > best_value:
+                best_value, best_field = value, field
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table[self.hash] = (depth, best_value, bound, best_field)
+        return best_value
+
+    def best_move(self, time_budget, max_depth=MAX_DEPTH):
+        """
+        Searches deeper and deeper until the time budget runs out
+        :return: field of the best move found by the deepest finished search
+        """
+        self.deadline = perf_counter() + time_budget
+        self.nodes = 0
+        self.depth = 0
+
+        if not any(self.near):
+            return CENTER
+        moves = self.moves()
+        best_field = moves[0][1]
+        if moves[0][0] is None or len(moves) == 1:
+            return best_field
+
+        for depth in range(1, max_depth + 1):
+            try:
+                value = self._negamax(depth, -WIN_SCORE - 1, WIN_SCORE + 1, 0)
+            except _Timeout:
+                break
+            if depth > 1:
+                best_field = self.table[self.hash][3]
+            self.depth = depth
+            # a forced win or loss was found, deeper search cannot change it
+            if abs(value) > WIN_SCORE - MAX_DEPTH:
+                break
+        return best_field
+
+
+def best_move(moves, time_budget, max_depth=MAX_DEPTH):
+    """
+    Searches the best move in the game after given moves
+    :param moves: moves made so far, packed with `board.pack_moves`
+    :return: (x, y) of the move, and dict with the number of searched
+             `nodes` and the `depth` reached
+    """
+    search = Search(moves)
+    field = search.best_move(time_budget, max_depth)
+    return divmod(field, BOARD_SIZE), {'nodes': search.nodes,
+                                      'depth': search.depth}
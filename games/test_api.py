@@ -1,7 +1,17 @@
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 
+from games import analytics, archive, audit, cache, events, export, openings, positions
+from games.board import pack_moves
 from games.example_data import *
+from games.models import Game, GamePosition, Move, OpeningMove, Player, StatsSnapshot
 from games.shortcuts import TestHelpers
 
 User = get_user_model()
@@ -19,6 +29,7 @@ class GamesAPITestCase(APITestCase, TestHelpers):
         user APIClient
         """
         self.maxDiff = None
+        cache.get_cache().clear()
         self.player_1 = User.objects.create_user(**self.PLAYER_1)
         self.player_2 = User.objects.create_user(**self.PLAYER_2)
         self.player_3 = User.objects.create_user(**self.PLAYER_3)
@@ -511,3 +522,836 @@ class GamesAPITestCase(APITestCase, TestHelpers):
 
         self._validate_me(self.default_game_mapping[order[0]], draws=1)
         self._validate_me(self.default_game_mapping[order[1]], draws=1)
+
+    def test_make_move_queries(self):
+        """
+         - posting a move runs a constant number of queries
+         - winning move only adds the player and users' statistics updates
+        """
+        game_id = self._create_working_game(self.player_1_client,
+                                            self.player_2_client)
+
+        response = self.player_1_client.get(
+            '/api/games/{}'.format(game_id),
+        )
+        order = self._players_order(response.json())
+        _, (winning_moves, losing_moves) = win_board(order[0], 'horizontal')
+
+        self._make_moves(game_id, order,
+                         (winning_moves[:-1], losing_moves[:-1]))
+
+        # savepoint, session, user, game, players, move, game update,
+        # position, release
+        with self.assertNumQueries(9):
+            response = self.default_game_mapping[order[1]].post(
+                '/api/games/{}/moves/'.format(game_id),
+                {'x': losing_moves[-1][0], 'y': losing_moves[-1][1]},
+            )
+        self.assertEqual(response.status_code, 200)
+
+        # ... plus winner's player, users' ratings and both users' statistics
+        # at once, and the opening book - its moves, savepoint, new moves,
+        # release, games and wins
+        with self.assertNumQueries(18):
+            response = self.default_game_mapping[order[0]].post(
+                '/api/games/{}/moves/'.format(game_id),
+                {'x': winning_moves[-1][0], 'y': winning_moves[-1][1]},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['game']['finished'])
+
+    def test_make_move_compact(self):
+        """
+         - compact response describes the move and the game without the board
+         - compact response is less than a tenth of the full one
+         - compact board of the game is a string of all the fields
+        """
+        game_id = self._create_working_game()
+        order = self._players_order(
+            self.player_1_client.get('/api/games/{}'.format(game_id)).json()
+        )
+        client = self.default_game_mapping[order[0]]
+
+        full = client.post('/api/games/{}/moves/'.format(game_id),
+                           {'x': 0, 'y': 0})
+        self.assertEqual(full.status_code, 200)
+
+        compact = self.default_game_mapping[order[1]].post(
+            '/api/games/{}/moves/?compact=1'.format(game_id), {'x': 1, 'y': 2},
+        )
+        self.assertEqual(compact.status_code, 200)
+        data = compact.json()
+        self.assertEqual((data['x'], data['y'], data['symbol']),
+                         (1, 2, order[1]))
+        self.assertEqual(data['now_turn'], full.json()['move']['player'])
+        self.assertFalse(data['finished'])
+        self.assertNotIn('board', data)
+        self.assertLess(len(compact.content) * 10, len(full.content))
+
+        response = client.get('/api/games/{}'.format(game_id),
+                              {'compact': 1})
+        self.assertEqual(response['ETag'], '"{}"'.format(data['version']))
+        board_ = response.json()['board']
+        self.assertEqual(len(board_), 225)
+        self.assertEqual((board_[0], board_[17]), (order[0], order[1]))
+        self.assertEqual(board_.count('.'), 223)
+
+    def test_game_cache(self):
+        """
+         - repeated request for an unchanged game is served from the cache
+           with just the version read from the database
+         - board is never served stale after a move
+        """
+        game_id = self._create_working_game()
+        url = '/api/games/{}'.format(game_id)
+        order = self._players_order(self.player_1_client.get(url).json())
+        cache.reset_stats()
+
+        # session, user, version
+        with self.assertNumQueries(3):
+            response = self.player_3_client.get(url)
+        self.assertEqual(cache.stats(), {'game': {'hits': 1, 'misses': 0}})
+
+        expected = response.json()['board']
+        for i, (x, y) in enumerate([(0, 0), (5, 5), (0, 1), (7, 3)]):
+            self._make_moves(game_id, order[i % 2:] + order[:i % 2],
+                             ([(x, y)], []))
+            expected[x][y] = order[i % 2]
+
+            for _ in range(2):
+                self.assertEqual(self.player_3_client.get(url).json()['board'],
+                                 expected)
+
+        self.assertEqual(cache.stats(), {'game': {'hits': 5, 'misses': 4}})
+
+    def test_matchmaking(self):
+        """
+         - user waits in the queue until another one comes
+         - both users are paired into a started game, one of them moves first
+         - users are paired only within their rating window
+         - user can leave the queue while waiting
+        """
+        url = '/api/games/match/'
+        response = self.player_1_client.post(url, {})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.player_1_client.get(url).status_code, 202)
+
+        response = self.player_2_client.post(url, {})
+        self.assertEqual(response.status_code, 200)
+        game = response.json()
+        self.assertTrue(game['started'])
+        self.assertEqual(sorted(player['user'] for player in game['players']),
+                         [self.player_1.pk, self.player_2.pk])
+        self.assertEqual([player['first'] for player in game['players']]
+                         .count(True), 1)
+
+        response = self.player_1_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], game['id'])
+        self.assertEqual(self.player_1_client.get(url).status_code, 404)
+
+        User.objects.filter(pk=self.player_3.pk).update(rating=1800)
+        self.player_3.refresh_from_db()
+        response = self.player_3_client.post(url, {'window': 100})
+        self.assertEqual(response.status_code, 202)
+        response = self.player_1_client.post(url, {'window': 500})
+        self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(self.player_3_client.delete(url).status_code, 200)
+        self.assertEqual(self.player_3_client.get(url).status_code, 404)
+        self.assertEqual(self.player_3_client.delete(url).status_code, 404)
+
+        response = self.player_1_client.post(url, {'window': 'close'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_matchmaking_unsuitable_waiting(self):
+        """
+         - users nobody fits the window of do not block pairing of the users
+           who came after them
+        """
+        url = '/api/games/match/'
+        for i in range(5):
+            user = User.objects.create_user(username='strong_{}'.format(i),
+                                            password='1234',
+                                            rating=2000 + 100 * i)
+            client = APIClient()
+            client.force_login(user)
+            self.assertEqual(client.post(url, {'window': 10}).status_code, 202)
+
+        User.objects.filter(pk__in=(self.player_1.pk, self.player_2.pk)) \
+            .update(rating=1500)
+        self.assertEqual(self.player_1_client.post(url, {}).status_code, 202)
+        response = self.player_2_client.post(url, {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(player['user']
+                                for player in response.json()['players']),
+                         [self.player_1.pk, self.player_2.pk])
+
+    def _bulk_games(self, pairs):
+        staff = User.objects.create_user(username='bot_runner',
+                                         password='4567', is_staff=True)
+        self.staff_client = APIClient()
+        self.staff_client.force_login(staff)
+        return self.staff_client.post('/api/games/bulk/', {'pairs': pairs},
+                                      format='json')
+
+    def test_bulk_games(self):
+        """
+         - trusted user creates many started games at once, the first user of
+           every pair moves first
+         - pairs of users are validated, other users cannot create games
+        """
+        pairs = [[self.player_1.pk, self.player_2.pk],
+                 [self.player_3.pk, self.player_1.pk]]
+        response = self._bulk_games(pairs)
+        self.assertEqual(response.status_code, 201)
+
+        games = response.json()
+        self.assertEqual(len(games), 2)
+        for game, pair in zip(games, pairs):
+            self.assertTrue(game['started'])
+            owner = next(p for p in game['players'] if p['owner'])
+            self.assertEqual(owner['user'], pair[0])
+            self.assertTrue(owner['first'])
+            self.assertEqual(
+                Game.objects.get(pk=game['id']).now_turn,
+                Player.objects.get(game_id=game['id'], user_id=pair[0]).pk,
+            )
+
+        for pairs in ([[self.player_1.pk, self.player_1.pk]],
+                      [[self.player_1.pk, 0]], [], [[1]], None):
+            response = self.staff_client.post('/api/games/bulk/',
+                                              {'pairs': pairs}, format='json')
+            self.assertEqual(response.status_code, 400)
+        for data in ([[self.player_1.pk, self.player_2.pk]], {}):
+            response = self.staff_client.post('/api/games/bulk/', data,
+                                              format='json')
+            self.assertEqual(response.status_code, 400)
+
+        response = self.player_1_client.post(
+            '/api/games/bulk/', {'pairs': pairs}, format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_moves(self):
+        """
+         - trusted user makes a whole sequence of moves at once, with
+           constant number of queries
+         - the moves are checked with the rules of single moves, nothing is
+           saved if any of them is invalid
+         - game finished by the moves is counted in the statistics
+        """
+        game_id = self._bulk_games(
+            [[self.player_1.pk, self.player_2.pk]]).json()[0]['id']
+        url = '/api/games/{}/moves/bulk/'.format(game_id)
+        moves = [[0, 0], [1, 0], [0, 1], [1, 1], [0, 2], [1, 2], [0, 3],
+                 [1, 3], [0, 4]]
+
+        for invalid, error in (([[0, 0], [0, 0]], ERROR_SPOT_TAKEN),
+                               ([[0, 0], [15, 0]], ERROR_INVALID_MOVE),
+                               (moves + [[5, 5]], ERROR_GAME_NOT_ACTIVE)):
+            response = self.staff_client.post(url, {'moves': invalid},
+                                              format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(),
+                             dict(error, move=len(invalid) - 1))
+        for data in (moves, {}, {'moves': None}):
+            response = self.staff_client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Move.objects.filter(game_id=game_id).exists())
+
+        # savepoint, session, user, game, players, moves, last move id, game
+        # update, positions, ... users' ratings and statistics, winner's
+        # player, opening book, release
+        with self.assertNumQueries(19):
+            response = self.staff_client.post(url, {'moves': moves},
+                                              format='json')
+        self.assertEqual(response.status_code, 200)
+        game = response.json()['game']
+        self.assertTrue(game['finished'])
+        self.assertEqual(game['board'][0][:5], [OWNER] * 5)
+        self.assertEqual(Game.objects.get(pk=game_id).moves,
+                         pack_moves(moves))
+
+        response = self.player_1_client.get(
+            '/api/games/{}/moves/'.format(game_id))
+        self.assertEqual([[move['x'], move['y']] for move in response.json()],
+                         moves[::-1])
+        response = self.player_1_client.get(
+            '/api/games/{}/moves/last/'.format(game_id))
+        self.assertEqual((response.json()['x'], response.json()['y']), (0, 4))
+        self.assertEqual(User.objects.get(pk=self.player_1.pk).won, 1)
+
+    def _finished_games(self):
+        """
+        Plays three games opened with (7, 7): player_1 wins against player_2
+        with five in a row, player_3 surrenders to player_1 after two moves,
+        and player_2 with player_3 are still playing after three moves
+        :return: ids of the won, the surrendered and the playing game
+        """
+        won_id, surrendered_id, playing_id = [
+            game['id'] for game in self._bulk_games(
+                [[self.player_1.pk, self.player_2.pk],
+                 [self.player_3.pk, self.player_1.pk],
+                 [self.player_2.pk, self.player_3.pk]]).json()
+        ]
+        for game_id, moves in ((won_id, [[7, 7], [0, 0], [7, 8], [0, 1],
+                                         [7, 9], [0, 2], [7, 10], [0, 3],
+                                         [7, 11]]),
+                               (surrendered_id, [[7, 7], [0, 14]]),
+                               (playing_id, [[7, 7], [0, 0], [7, 6]])):
+            self.staff_client.post('/api/games/{}/moves/bulk/'.format(game_id),
+                                   {'moves': moves}, format='json')
+        self.player_3_client.post(
+            '/api/games/{}/surrender/'.format(surrendered_id), {},
+        )
+        return won_id, surrendered_id, playing_id
+
+    def test_positions(self):
+        """
+         - games are found by a position reached after given moves or on given
+           board, also in other order of the moves, rotated or reflected
+         - positions not reached in any game, or not valid, are not found
+         - positions are indexed both by single and bulk moves, and again by
+           the backfill, also for archived games
+        """
+        bulk_id, single_id = [
+            game['id'] for game in self._bulk_games(
+                [[self.player_1.pk, self.player_2.pk],
+                 [self.player_2.pk, self.player_3.pk]]).json()
+        ]
+        self.staff_client.post('/api/games/{}/moves/bulk/'.format(bulk_id),
+                               {'moves': [[7, 7], [7, 8], [8, 8], [0, 0]]},
+                               format='json')
+        # the same position transposed, reached in other order
+        for client, (x, y) in zip((self.player_2_client, self.player_3_client,
+                                   self.player_2_client),
+                                  ((8, 8), (8, 7), (7, 7))):
+            client.post('/api/games/{}/moves/'.format(single_id),
+                        {'x': x, 'y': y})
+
+        def found(data):
+            response = self.player_1_client.post('/api/games/positions/',
+                                                 data, format='json')
+            self.assertEqual(response.status_code, 200)
+            return [(match['ply'], match['game']['id'])
+                    for match in response.json()]
+
+        expected = [(3, single_id), (3, bulk_id)]
+        board = Game.objects.get(pk=single_id).board
+        self.assertEqual(found({'moves': [[7, 7], [7, 8], [8, 8]]}), expected)
+        self.assertEqual(found({'moves': [[7, 7], [6, 7], [6, 6]]}), expected)
+        self.assertEqual(found({'board': board.to_list()}), expected)
+        self.assertEqual(found({'board': board.to_string()}), expected)
+        self.assertEqual(found({'moves': [[6, 8]]}), [(1, single_id)])
+        self.assertEqual(found({'moves': [[7, 7], [7, 9], [8, 8]]}), [])
+
+        for data in ({'moves': [[7, 7], [7, 7]]}, {'moves': [[15, 0]]},
+                     {'moves': []}, {'board': 'o' * 225}, {'board': [[]]}):
+            response = self.player_1_client.post('/api/games/positions/',
+                                                 data, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        indexed = sorted(GamePosition.objects.values_list('hash', 'game_id',
+                                                          'ply'))
+        GamePosition.objects.all().delete()
+        Game.objects.filter(pk=bulk_id).update(
+            finished=True, last_activity=timezone.now() - timedelta(days=31))
+        self.assertEqual(sum(archive.archive()), 1)
+        self.assertEqual(sum(positions.backfill()), 2)
+        self.assertEqual(sorted(GamePosition.objects.values_list(
+            'hash', 'game_id', 'ply')), indexed)
+        self.assertEqual(found({'moves': [[7, 8], [7, 7], [8, 8]]}), [])
+        self.assertEqual(found({'moves': [[8, 8], [8, 7], [7, 7]]}), expected)
+
+    def test_openings(self):
+        """
+         - moves played in a position of finished games are listed with their
+           results, the most often played first
+         - the position is found also rotated or reflected, with the moves
+           turned the same way
+         - unfinished games are not in the book, rebuilt book is the same
+        """
+        won_id, surrendered_id, playing_id = self._finished_games()
+
+        def explore(moves):
+            response = self.player_2_client.get('/api/games/openings/',
+                                                {'moves': moves})
+            self.assertEqual(response.status_code, 200)
+            return [(move['x'], move['y'], move['games'], move['wins'],
+                     move['draws']) for move in response.json()]
+
+        self.assertEqual(explore(''), [(7, 7, 2, 1, 0)])
+        self.assertEqual(explore('7,7'), [(0, 0, 1, 0, 0), (0, 14, 1, 1, 0)])
+        self.assertEqual(explore('7,7,0,0'), [(7, 8, 1, 1, 0)])
+        self.assertEqual(explore('7,7,14,14'), [(7, 6, 1, 1, 0)])
+        self.assertEqual(explore('7,7,0,0,7,8,0,1,7,9,0,2,7,10,0,3'),
+                         [(7, 11, 1, 1, 0)])
+        self.assertEqual(explore('7,7,1,1'), [])
+
+        for moves in ('7', '7,7,7,7', 'a,b', '15,0'):
+            response = self.player_2_client.get('/api/games/openings/',
+                                                {'moves': moves})
+            self.assertEqual(response.status_code, 400)
+
+        book = sorted(OpeningMove.objects.values_list(
+            'position', 'field', 'games', 'wins', 'draws'))
+        self.assertEqual(openings.rebuild(), 2)
+        self.assertEqual(sorted(OpeningMove.objects.values_list(
+            'position', 'field', 'games', 'wins', 'draws')), book)
+
+    def test_stats(self):
+        """
+         - statistics are not computed by the request, there are none until
+           a snapshot is taken
+         - statistics of finished games are served from the snapshot until a
+           new one is taken
+         - archived games are counted as well
+        """
+        won_id, surrendered_id, playing_id = self._finished_games()
+
+        # savepoint, session, user, latest snapshot, release
+        with self.assertNumQueries(5):
+            response = self.player_2_client.get('/api/games/stats/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(StatsSnapshot.objects.exists())
+
+        analytics.snapshot()
+        response = self.player_2_client.get('/api/games/stats/')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        heatmap = stats.pop('heatmap')
+        self.assertTrue(stats.pop('created'))
+        self.assertEqual(stats, {'games': 2, 'moves': 11, 'first_wins': 1,
+                                 'second_wins': 1, 'draws': 0,
+                                 'first_win_rate': 0.5, 'draw_rate': 0.0,
+                                 'average_length': 5.5})
+        self.assertEqual(heatmap['first'][7][7], 2)
+        self.assertEqual(heatmap['second'][0][14], 1)
+        self.assertEqual(sum(map(sum, heatmap['first'])), 6)
+        self.assertEqual(sum(map(sum, heatmap['second'])), 5)
+
+        self.player_2_client.post('/api/games/{}/surrender/'.format(playing_id), {})
+        self.assertEqual(
+            self.player_2_client.get('/api/games/stats/').json()['games'], 2)
+        Game.objects.update(last_activity=timezone.now() - timedelta(days=31))
+        self.assertEqual(sum(archive.archive()), 3)
+        analytics.snapshot(chunk_size=2)
+        stats = self.player_2_client.get('/api/games/stats/').json()
+        self.assertEqual((stats['games'], stats['moves'], stats['first_wins']),
+                         (3, 14, 1))
+
+    def test_audit(self):
+        """
+         - consistent games, hot and archived, and users pass the audit
+         - games, players and users not agreeing with the history of moves
+           are reported and repaired, moves breaking the rules are reported
+         - games, their players and users changed since the audit are not
+           repaired, repaired players move the version of their game on
+        """
+        won_id, surrendered_id, playing_id = self._finished_games()
+        Game.objects.filter(pk=won_id).update(
+            last_activity=timezone.now() - timedelta(days=31))
+        self.assertEqual(sum(archive.archive()), 1)
+
+        report = audit.audit(workers=0, chunk_size=2)
+        self.assertEqual(report.issues, [])
+        self.assertEqual(report.games, 3)
+
+        Game.objects.filter(pk=playing_id).update(moves=b'', finished=True)
+        Player.objects.filter(game_id=surrendered_id).update(won=False)
+        User.objects.filter(pk=self.player_2.pk).update(won=5)
+        last = Move.objects.filter(game_id=surrendered_id).order_by('id').last()
+        extra = Move.objects.create(player_id=last.player_id,
+                                    game_id=surrendered_id, x=0, y=14)
+
+        report = audit.audit(workers=0)
+        issues = {(issue.kind, issue.field, issue.repairable)
+                  for issue in report.issues}
+        self.assertEqual(issues, {
+            ('game', 'moves', True), ('game', 'finished', True),
+            ('game', 'winner', False), ('game', 'moves_count', True),
+            ('game', 'last_move_id', True), ('game', 'last_move_timestamp', True),
+            ('move', 'player', False), ('move', 'field', False),
+            ('user', 'won', True), ('user', 'won_by_surrender', True),
+            ('user', 'lost', True), ('user', 'surrendered', True),
+        })
+
+        self.assertEqual(audit.repair(report), [])
+        extra.delete()
+        Player.objects.filter(game_id=surrendered_id, owner=False).update(won=True)
+        report = audit.audit(workers=0)
+        self.assertEqual({(issue.kind, issue.pk) for issue in report.issues},
+                         {('game', surrendered_id), ('user', self.player_1.pk),
+                          ('user', self.player_3.pk)})
+        Game.objects.filter(pk=surrendered_id).update(version=100)
+        self.assertEqual(audit.repair(report), [('game', surrendered_id)])
+
+        game = Game.objects.get(pk=playing_id)
+        self.assertEqual((game.moves, game.finished),
+                         (pack_moves([(7, 7), (0, 0), (7, 6)]), False))
+        self.assertEqual(
+            User.objects.filter(pk=self.player_2.pk).values_list('won', 'score').get(),
+            (0, 0))
+
+        Player.objects.filter(game_id=playing_id, owner=True).update(won=True)
+        User.objects.filter(pk=self.player_2.pk).update(draws=7)
+        report = audit.audit(workers=0)
+        self.assertEqual({(issue.kind, issue.field) for issue in report.issues},
+                         {('player', 'won'), ('user', 'draws'),
+                          ('game', 'moves'), ('game', 'moves_count'),
+                          ('game', 'last_move_id'),
+                          ('game', 'last_move_timestamp')})
+        User.objects.filter(pk=self.player_2.pk).update(draws=8)
+        # scores of users which are not repaired are left alone
+        User.objects.filter(pk=self.player_1.pk).update(score=100)
+        version = Game.objects.get(pk=playing_id).version
+        self.assertEqual(audit.repair(report), [('user', self.player_2.pk)])
+        self.assertEqual(User.objects.get(pk=self.player_1.pk).score, 100)
+        self.assertEqual(Game.objects.get(pk=playing_id).version, version + 1)
+        self.assertFalse(Player.objects.filter(game_id=playing_id,
+                                               won=True).exists())
+        self.assertEqual(User.objects.get(pk=self.player_2.pk).draws, 8)
+
+    def test_archive(self):
+        """
+         - finished games idle for days are moved out of the hot tables with
+           their players and moves, other games stay
+         - archived game, its moves and last move are served as before, with
+           the same version, and with current names of the players
+         - archived games are listed among games of the user, in order
+        """
+        won_id, surrendered_id, playing_id = [
+            game['id'] for game in self._bulk_games(
+                [[self.player_1.pk, self.player_2.pk],
+                 [self.player_3.pk, self.player_1.pk],
+                 [self.player_1.pk, self.player_3.pk]]).json()
+        ]
+        moves = [[0, 0], [1, 0], [0, 1], [1, 1], [0, 2], [1, 2], [0, 3],
+                 [1, 3], [0, 4]]
+        self.staff_client.post('/api/games/{}/moves/bulk/'.format(won_id),
+                               {'moves': moves}, format='json')
+        self.player_1_client.post(
+            '/api/games/{}/surrender/'.format(surrendered_id), {},
+        )
+        recent_id = self._create_game(self.player_1_client)
+        Game.objects.exclude(pk=recent_id).update(
+            last_activity=timezone.now() - timedelta(days=31))
+
+        urls = ['/api/games/{}'.format(won_id),
+                '/api/games/{}?compact=1'.format(won_id),
+                '/api/games/{}/moves/'.format(won_id),
+                '/api/games/{}/moves/last/'.format(won_id),
+                '/api/games/{}'.format(surrendered_id),
+                '/api/games/{}/moves/'.format(surrendered_id),
+                '/api/games/{}/moves/last/'.format(surrendered_id)]
+        before = [self.player_2_client.get(url) for url in urls]
+        games_before = self.player_1_client.get('/api/user/me/games/').json()
+
+        self.assertEqual(sum(archive.archive()), 2)
+        self.assertEqual(sum(archive.archive()), 0)
+        self.assertEqual(
+            set(Game.objects.values_list('id', flat=True)),
+            {playing_id, recent_id},
+        )
+        self.assertFalse(Player.objects.filter(
+            game_id__in=(won_id, surrendered_id)).exists())
+        self.assertFalse(Move.objects.filter(
+            game_id__in=(won_id, surrendered_id)).exists())
+
+        cache.get_cache().clear()
+        for url, expected in zip(urls, before):
+            response = self.player_2_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected.json())
+            self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+        # savepoint, session, user, games, players, archived games, their
+        # players, release
+        with self.assertNumQueries(8):
+            response = self.player_1_client.get('/api/user/me/games/')
+        self.assertEqual(response.json(), games_before)
+        response = self.player_1_client.get('/api/user/me/games/',
+                                            {'limit': 2})
+        response = self.player_1_client.get(
+            response['Link'].split('>')[0].lstrip('<'))
+        self.assertEqual(response.json(), games_before[2:])
+
+        User.objects.filter(pk=self.player_2.pk).update(username='renamed')
+        cache.get_cache().clear()
+        response = self.player_1_client.get('/api/games/{}'.format(won_id))
+        self.assertIn('renamed', [player['name']
+                                  for player in response.json()['players']])
+
+    def test_export(self):
+        """
+         - trusted user streams finished games with their ordered moves as
+           JSON lines or in the binary format, unfinished games are left out
+         - both formats carry the same games, also when read in small batches
+         - archived games are exported after the hot ones, games archived
+           during the export only once
+         - other users cannot export games
+        """
+        won_id, surrendered_id, _ = [game['id'] for game in self._bulk_games(
+            [[self.player_1.pk, self.player_2.pk],
+             [self.player_3.pk, self.player_1.pk],
+             [self.player_2.pk, self.player_3.pk]]).json()]
+        moves = [[0, 0], [1, 0], [0, 1], [1, 1], [0, 2], [1, 2], [0, 3],
+                 [1, 3], [0, 4]]
+        self.staff_client.post('/api/games/{}/moves/bulk/'.format(won_id),
+                               {'moves': moves}, format='json')
+        self.staff_client.post(
+            '/api/games/{}/moves/bulk/'.format(surrendered_id),
+            {'moves': [[7, 7]]}, format='json',
+        )
+        self.player_1_client.post(
+            '/api/games/{}/surrender/'.format(surrendered_id), {},
+        )
+
+        expected = [
+            {'id': won_id, 'owner': self.player_1.pk,
+             'guest': self.player_2.pk, 'first': self.player_1.pk,
+             'winner': self.player_1.pk, 'draw': False, 'surrendered': False,
+             'moves': moves},
+            {'id': surrendered_id, 'owner': self.player_3.pk,
+             'guest': self.player_1.pk, 'first': self.player_3.pk,
+             'winner': self.player_3.pk, 'draw': False, 'surrendered': True,
+             'moves': [[7, 7]]},
+        ]
+
+        response = self.staff_client.get('/api/games/export/')
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+        response = self.staff_client.get('/api/games/export/',
+                                         {'binary': 1})
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        data = io.BytesIO(b''.join(response.streaming_content))
+        self.assertEqual(list(export.read_binary(data)), expected)
+        self.assertEqual(
+            len(data.getvalue()),
+            2 * export.RECORD_HEADER.size + 2 * (len(moves) + 1),
+        )
+
+        self.assertEqual(
+            [game for batch in export.finished_games(batch_size=1)
+             for game in batch],
+            expected,
+        )
+
+        # game archived after it was exported is not exported again
+        games = export.finished_games(batch_size=1)
+        exported = next(games)
+        Game.objects.filter(pk=won_id).update(
+            last_activity=timezone.now() - timedelta(days=31))
+        self.assertEqual(sum(archive.archive()), 1)
+        exported += [game for batch in games for game in batch]
+        self.assertEqual(exported, expected)
+
+        # archived games follow the hot ones
+        for batch_size in (1, export.BATCH_SIZE):
+            self.assertEqual(
+                [game for batch in export.finished_games(batch_size)
+                 for game in batch],
+                expected[::-1],
+            )
+
+        response = self.player_1_client.get('/api/games/export/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_games_list_pages(self):
+        """
+         - list of games is split into pages of requested size
+         - link to the next page is sent in the Link header
+         - number of queries does not depend on number of games
+        """
+        game_ids = [self._create_game(self.player_1_client) for _ in range(5)]
+
+        # savepoint, session, user, games, players, release
+        with self.assertNumQueries(6):
+            response = self.player_2_client.get(
+                '/api/games/', {'limit': 3},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([game['id'] for game in response.json()],
+                         game_ids[:3])
+        self.assertIn('rel="next"', response['Link'])
+
+        next_url = response['Link'].split(';')[0].strip('<>')
+        response = self.player_2_client.get(next_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([game['id'] for game in response.json()],
+                         game_ids[3:])
+        self.assertNotIn('rel="next"', response['Link'])
+
+    def test_games_list_filters(self):
+        """
+         - games can be filtered by their state and number of players
+         - joinable games are the ones not started with a free spot
+         - invalid filter value is rejected
+        """
+        waiting_id = self._create_game(self.player_1_client)
+        full_id = self._create_game(self.player_1_client)
+        self._game_ops(full_id, self.player_2_client)
+        started_id = self._create_working_game()
+
+        def listed(**params):
+            response = self.player_3_client.get('/api/games/', params)
+            self.assertEqual(response.status_code, 200)
+            return [game['id'] for game in response.json()]
+
+        self.assertEqual(listed(), [waiting_id, full_id, started_id])
+        self.assertEqual(listed(joinable='true'), [waiting_id])
+        self.assertEqual(listed(started='true'), [started_id])
+        self.assertEqual(listed(started='false'), [waiting_id, full_id])
+        self.assertEqual(listed(players_count=2), [full_id, started_id])
+
+        response = self.player_3_client.get(
+            '/api/games/', {'players_count': 'two'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_last_move(self):
+        """
+         - last move is empty before any move is made
+         - last move is the most recent one from the list of moves
+         - last move is read with a single query on the game
+        """
+        game_id = self._create_working_game()
+
+        response = self.player_1_client.get(
+            '/api/games/{}/moves/last/'.format(game_id),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'player': None, 'x': None,
+                                           'y': None})
+
+        response = self.player_1_client.get(
+            '/api/games/{}'.format(game_id),
+        )
+        order = self._players_order(response.json())
+        self._make_moves(game_id, order, ([(0, 0), (1, 1)], [(2, 2)]))
+
+        # session, user, game
+        with self.assertNumQueries(3):
+            response = self.player_3_client.get(
+                '/api/games/{}/moves/last/'.format(game_id),
+            )
+        self.assertEqual(response.status_code, 200)
+
+        moves = self.player_3_client.get(
+            '/api/games/{}/moves/'.format(game_id),
+        ).json()
+        self.assertEqual(len(moves), 3)
+        self.assertEqual(response.json(), moves[0])
+        self.assertEqual((moves[0]['x'], moves[0]['y']), (1, 1))
+
+        response = self.player_3_client.get('/api/games/0/moves/last/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_game_etag(self):
+        """
+         - game is sent with its version in the ETag header
+         - game is not sent again while the version did not change
+         - last move uses the same version
+        """
+        game_id = self._create_working_game()
+
+        response = self.player_1_client.get('/api/games/{}'.format(game_id))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        for url in ('/api/games/{}', '/api/games/{}/moves/last/'):
+            response = self.player_1_client.get(url.format(game_id),
+                                                HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+        order = self._players_order(
+            self.player_1_client.get('/api/games/{}'.format(game_id)).json()
+        )
+        self._make_moves(game_id, order, ([(0, 0)], []))
+
+        response = self.player_1_client.get('/api/games/{}'.format(game_id),
+                                            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['board'][0][0], order[0])
+
+    def test_game_long_poll(self):
+        """
+         - waiting for a version older than the current one returns at once
+         - waiting for the current version ends with 304 after the timeout,
+           negative timeout ends it at once
+         - invalid version or timeout is rejected, waiting for missing game
+           gives 404
+        """
+        game_id = self._create_working_game()
+        url = '/api/games/{}'.format(game_id)
+        version = int(self.player_1_client.get(url)['ETag'].strip('"'))
+
+        response = self.player_1_client.get(
+            url, {'wait_for_version': version - 1},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"{}"'.format(version))
+
+        response = self.player_1_client.get(
+            url, {'wait_for_version': version, 'timeout': 0.1},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.player_1_client.get(
+            url, {'wait_for_version': version, 'timeout': -1},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        for params in ({'wait_for_version': 'last'},
+                       {'wait_for_version': version, 'timeout': 'nan'},
+                       {'wait_for_version': version, 'timeout': 'inf'}):
+            response = self.player_1_client.get(url, params)
+            self.assertEqual(response.status_code, 400)
+
+        response = self.player_1_client.get(
+            '/api/games/0', {'wait_for_version': 0, 'timeout': 0.1},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_game_events(self):
+        """
+         - event stream starts with the current state of the game
+         - published changes are streamed as they come, older are skipped
+         - stream of a missing game gives 404
+        """
+        game_id = self._create_working_game()
+        version = int(self.player_1_client.get(
+            '/api/games/{}'.format(game_id))['ETag'].strip('"'))
+
+        response = self.player_1_client.get(
+            '/api/games/{}/events/'.format(game_id),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+
+        lines = next(stream).decode().split('\n')
+        self.assertEqual(lines[:2], ['id: {}'.format(version), 'event: state'])
+        state = json.loads(lines[2][len('data: '):])
+        self.assertEqual(state['version'], version)
+        self.assertTrue(state['started'])
+
+        events.publish(game_id, dict(state, type='move', version=version))
+        events.publish(game_id, dict(state, type='move', version=version + 1,
+                                     x=1, y=2, symbol=OWNER))
+        lines = next(stream).decode().split('\n')
+        self.assertEqual(lines[1], 'event: move')
+        self.assertEqual(json.loads(lines[2][len('data: '):])['x'], 1)
+        # the finished request must not close the connection the test runs in
+        with mock.patch.object(connection, 'close_if_unusable_or_obsolete'):
+            response.close()
+
+        self.assertNotIn(game_id, events.get_backend()._subscriptions)
+
+        response = self.player_1_client.get('/api/games/0/events/')
+        self.assertEqual(response.status_code, 404)
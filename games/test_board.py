@@ -0,0 +1,198 @@
+from random import Random
+
+from django.test import SimpleTestCase
+
+from games.board import BitBoard, pack_moves, unpack_moves
+from games.example_data import *
+
+
+def full_board_scan(board_):
+    """
+    Reference win detection - scans every row, column and diagonal of the
+    board for five stones of the same player in a row.
+    """
+    verticals = [[row[i] for row in board_] for i in range(15)]
+    diagonals1 = [[board_[j][i + j] for j in range(15 - i)]
+                  for i in range(11)] + \
+                 [[board_[i + j][j] for j in range(15 - i)]
+                  for i in range(1, 11)]
+    diagonals2 = [[board_[i - j][j] for j in range(i + 1)]
+                  for i in range(4, 15)] + \
+                 [[board_[14 - j][i + j] for j in range(15 - i)]
+                  for i in range(1, 11)]
+
+    for row in board_ + verticals + diagonals1 + diagonals2:
+        for i in range(len(row) - 4):
+            if row[i:i + 5] in [list('o' * 5), list('g' * 5)]:
+                return True
+    return False
+
+
+def random_board(rng, density):
+    return [
+        [rng.choice((OWNER, GUEST)) if rng.random() < density else None
+         for _ in range(15)]
+        for __ in range(15)
+    ]
+
+
+class BoardTestCase(SimpleTestCase):
+    def test_winning_lines(self):
+        """
+         - five in a row is recognized in every direction, whichever of the
+           stones was placed last
+        """
+        for variant in MAP_MOVES:
+            for first in (OWNER, GUEST):
+                board_, (winning_moves, _) = win_board(first, variant)
+                bitboard = BitBoard.from_list(board_)
+                for x, y in winning_moves:
+                    self.assertTrue(bitboard.is_winning_move(x, y))
+
+    def test_losing_moves(self):
+        """
+         - stones of the other player do not win the game
+        """
+        for variant in MAP_MOVES:
+            board_, (_, losing_moves) = win_board(OWNER, variant)
+            bitboard = BitBoard.from_list(board_)
+            for x, y in losing_moves:
+                self.assertFalse(bitboard.is_winning_move(x, y))
+
+    def test_four_is_not_enough(self):
+        """
+         - four stones in a row do not win
+         - line interrupted by the other player does not win
+        """
+        board_ = [row[:] for row in EMPTY_BOARD]
+        for y in range(4):
+            board_[7][y] = OWNER
+        self.assertFalse(BitBoard.from_list(board_).is_winning_move(7, 3))
+
+        board_[7][4] = GUEST
+        board_[7][5] = OWNER
+        self.assertFalse(BitBoard.from_list(board_).is_winning_move(7, 5))
+
+    def test_five_elsewhere(self):
+        """
+         - stone not on a line of five does not win, even when there is one
+           elsewhere on the board
+        """
+        board_ = [row[:] for row in EMPTY_BOARD]
+        for y in range(5):
+            board_[0][y] = OWNER
+        board_[7][7] = OWNER
+        bitboard = BitBoard.from_list(board_)
+        self.assertTrue(bitboard.is_winning_move(0, 2))
+        self.assertFalse(bitboard.is_winning_move(7, 7))
+
+    def test_empty_field(self):
+        """
+         - free field is never a winning move
+        """
+        self.assertFalse(BitBoard().is_winning_move(7, 7))
+
+    def test_matches_full_board_scan(self):
+        """
+         - on randomly generated boards without five in a row, placing
+           a stone gives the same result as scanning the whole board
+        """
+        rng = Random(2017)
+        checked = 0
+        while checked < 2000:
+            board_ = random_board(rng, rng.uniform(0.1, 0.6))
+            if full_board_scan(board_):
+                continue
+
+            free = [(x, y) for x in range(15) for y in range(15)
+                    if board_[x][y] is None]
+            x, y = rng.choice(free)
+            board_[x][y] = rng.choice((OWNER, GUEST))
+
+            self.assertEqual(BitBoard.from_list(board_).is_winning_move(x, y),
+                             full_board_scan(board_))
+            checked += 1
+
+    def test_is_full(self):
+        """
+         - board is full only when there is no free field left
+        """
+        board_, _ = draw_board()
+        self.assertTrue(BitBoard.from_list(board_).is_full())
+
+        board_[14][14] = None
+        self.assertFalse(BitBoard.from_list(board_).is_full())
+        self.assertFalse(BitBoard.from_list(EMPTY_BOARD).is_full())
+
+    def test_list_round_trip(self):
+        """
+         - nested list board converts to bitboard and back unchanged
+        """
+        rng = Random(23)
+        for _ in range(100):
+            board_ = random_board(rng, rng.random())
+            self.assertEqual(BitBoard.from_list(board_).to_list(), board_)
+
+    def test_string_round_trip(self):
+        """
+         - string board lists all the fields row by row and parses back
+        """
+        rng = Random(6)
+        for _ in range(100):
+            board_ = random_board(rng, rng.random())
+            bitboard = BitBoard.from_list(board_)
+            string = bitboard.to_string()
+            self.assertEqual(string, ''.join(symbol or '.'
+                                             for row in board_
+                                             for symbol in row))
+            self.assertEqual(BitBoard.from_string(string), bitboard)
+
+    def test_moves_round_trip(self):
+        """
+         - packed moves take a byte per move and unpack unchanged
+         - board replayed from the moves equals the one they were placed on,
+           whichever player moved first
+        """
+        rng = Random(6)
+        fields = [(x, y) for x in range(15) for y in range(15)]
+        for first, second in ((OWNER, GUEST), (GUEST, OWNER)):
+            for _ in range(50):
+                moves = rng.sample(fields, rng.randint(0, len(fields)))
+                packed = pack_moves(moves)
+                self.assertEqual(len(packed), len(moves))
+                self.assertEqual(unpack_moves(packed), moves)
+
+                bitboard = BitBoard()
+                for i, (x, y) in enumerate(moves):
+                    bitboard.place(x, y, (first, second)[i % 2])
+                self.assertEqual(BitBoard.from_moves(packed, first), bitboard)
+
+    def test_place_and_count(self):
+        """
+         - placed stones are reported on their fields and counted
+        """
+        bitboard = BitBoard()
+        bitboard.place(0, 14, OWNER)
+        bitboard.place(14, 0, GUEST)
+
+        self.assertEqual(bitboard.get(0, 14), OWNER)
+        self.assertEqual(bitboard.get(14, 0), GUEST)
+        self.assertIsNone(bitboard.get(1, 0))
+        self.assertFalse(bitboard.is_free(0, 14))
+        self.assertTrue(bitboard.is_free(1, 0))
+        self.assertEqual(bitboard.count(), 2)
+
+    def test_no_wrap_around_edges(self):
+        """
+         - stones at the end of one row and the start of the next do not
+           form a line
+        """
+        board_ = [row[:] for row in EMPTY_BOARD]
+        for x, y in ((6, 12), (6, 13), (6, 14), (7, 0), (7, 1)):
+            board_[x][y] = OWNER
+        self.assertFalse(BitBoard.from_list(board_).is_winning_move(7, 1))
+
+        board_ = [row[:] for row in EMPTY_BOARD]
+        for x, y in ((0, 2), (1, 1), (2, 0), (3, 14), (4, 13)):
+            board_[x][y] = OWNER
+        self.assertFalse(BitBoard.from_list(board_).is_winning_move(4, 13))
@@ -0,0 +1,322 @@
+from contextlib import contextmanager
+from io import StringIO
+from threading import Barrier, Thread
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import override_settings
+from rest_framework.test import APITransactionTestCase, APIClient
+
+from games import bot, cache, events
+from games.example_data import *
+from games.api.serializers import MoveSerializer
+from games.models import Game, MatchTicket, Move, Player
+from games.shortcuts import TestHelpers
+
+User = get_user_model()
+
+
+class GamesConcurrencyTestCase(APITransactionTestCase, TestHelpers):
+    THREADS = 8
+    ROUNDS = 10
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.player_1 = User.objects.create_user(username='player_1',
+                                                 password='1234')
+        self.player_2 = User.objects.create_user(username='player_2',
+                                                 password='2345')
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_login(user)
+        return client
+
+    @contextmanager
+    def _lined_up(self, target, name):
+        """
+        Makes the concurrent requests wait for each other before calling
+        given method - their first write - so all of them have read the same
+        version of the game before any of them changes it
+        """
+        barrier = Barrier(self.THREADS)
+        original = getattr(target, name)
+
+        def wait_then_call(*args, **kwargs):
+            barrier.wait(timeout=10)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(target, name, autospec=True,
+                               side_effect=wait_then_call):
+            yield
+
+    def _in_parallel(self, requests):
+        """
+        Fires all the given requests at the same time, each from its own
+        thread and database connection
+        :param requests: list of callables performing a request
+        :return: list of response status codes
+        """
+        barrier = Barrier(len(requests))
+        statuses = [None] * len(requests)
+        errors = []
+
+        def run(i, request):
+            try:
+                barrier.wait()
+                statuses[i] = request().status_code
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=run, args=(i, request))
+                   for i, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return statuses
+
+    def test_parallel_moves(self):
+        """
+         - of the moves posted at the same time exactly one is accepted, the
+           others are rejected as conflicting
+         - board and history of moves stay consistent
+        """
+        clients = {self.player_1.pk: self._client(self.player_1),
+                   self.player_2.pk: self._client(self.player_2)}
+        game_id = self._create_working_game(clients[self.player_1.pk],
+                                            clients[self.player_2.pk])
+        free = [(x, y) for x in range(15) for y in range(15)]
+
+        for _ in range(self.ROUNDS):
+            game = Game.objects.get(pk=game_id)
+            client = clients[Player.objects.get(pk=game.now_turn).user_id]
+            fields = [free.pop() for __ in range(self.THREADS)]
+
+            with self._lined_up(MoveSerializer, 'save'):
+                statuses = self._in_parallel([
+                    lambda x=x, y=y: client.post(
+                        '/api/games/{}/moves/'.format(game_id), {'x': x, 'y': y},
+                    )
+                    for x, y in fields
+                ])
+            self.assertEqual(statuses.count(200), 1)
+            self.assertEqual(statuses.count(409), self.THREADS - 1)
+
+        game = Game.objects.get(pk=game_id)
+        moves = Move.objects.filter(game=game).select_related('player')
+
+        self.assertEqual(game.board.count(), moves.count())
+        self.assertEqual(game.version, 2 + moves.count())
+        for move in moves:
+            self.assertEqual(game.board.get(move.x, move.y),
+                             OWNER if move.player.owner else GUEST)
+
+    def test_parallel_joins(self):
+        """
+         - of the users joining a game at the same time exactly one gets in,
+           the others are rejected as conflicting
+         - number of players stays consistent with the game
+        """
+        users = [User.objects.create_user(username='user_{}'.format(i),
+                                          password='1234')
+                 for i in range(self.THREADS)]
+        game_id = self._create_game(self._client(self.player_1))
+
+        with self._lined_up(Game, 'save_if_unchanged'):
+            statuses = self._in_parallel([
+                lambda client=self._client(user): self._game_ops(game_id, client)
+                for user in users
+            ])
+
+        self.assertEqual(statuses.count(200), 1)
+        self.assertEqual(statuses.count(409), self.THREADS - 1)
+
+        game = Game.objects.get(pk=game_id)
+        self.assertEqual(Player.objects.filter(game=game).count(),
+                         game.players_count)
+
+    def test_move_published(self):
+        """
+         - committed move is published to subscribers of the game with the
+           changed field and whose turn is next
+        """
+        client_1 = self._client(self.player_1)
+        client_2 = self._client(self.player_2)
+        game_id = self._create_working_game(client_1, client_2)
+        game = Game.objects.get(pk=game_id)
+        player = Player.objects.get(pk=game.now_turn)
+        client = client_1 if player.user_id == self.player_1.pk else client_2
+
+        with events.subscribe(game_id) as subscription:
+            client.post('/api/games/{}/moves/'.format(game_id),
+                        {'x': 3, 'y': 4})
+            event = subscription.get(1)
+
+        self.assertEqual(event['type'], 'move')
+        self.assertEqual((event['x'], event['y']), (3, 4))
+        self.assertEqual(event['symbol'], OWNER if player.owner else GUEST)
+        self.assertEqual(event['version'], game.version + 1)
+        self.assertNotEqual(event['now_turn'], player.pk)
+
+    def _bot_game(self, client):
+        """
+        :return: id of a new game of the user with the bot invited
+        """
+        game_id = self._create_game(client)
+        self._game_ops(game_id, client, 'bot')
+        return game_id
+
+    def _start_bot_game(self, client, game_id):
+        """Starts the game with the bot, with the first move if it is the user's"""
+        self._game_ops(game_id, client, 'start')
+        game = Game.objects.get(pk=game_id)
+        if Player.objects.get(pk=game.now_turn).owner:
+            client.post('/api/games/{}/moves/'.format(game_id),
+                        {'x': 7, 'y': 7})
+
+    def _bot_move(self, client, game_id):
+        """
+        Starts the game with the bot and waits for the bot's move
+        :return: published event of the move, None if it was not made
+        """
+        with events.subscribe(game_id) as subscription:
+            self._start_bot_game(client, game_id)
+            event = subscription.get(10)
+            while event is not None and (event['type'] != 'move' or
+                                         event['symbol'] != GUEST):
+                event = subscription.get(10)
+        return event
+
+    @override_settings(GAMES_BOT_TIME_BUDGET=0.1)
+    def test_bot_moves(self):
+        """
+         - invited bot joins the game of the owner as its guest
+         - once it is its turn, the bot makes a move searched in the
+           background and publishes it
+        """
+        client = self._client(self.player_1)
+        game_id = self._bot_game(client)
+        self.assertTrue(Player.objects.get(game_id=game_id,
+                                           owner=False).user.is_bot)
+
+        event = self._bot_move(client, game_id)
+
+        self.assertIsNotNone(event)
+        game = Game.objects.get(pk=game_id)
+        self.assertEqual(game.board.get(event['x'], event['y']), GUEST)
+        self.assertEqual(Move.objects.filter(game=game).count(),
+                         len(game.moves))
+        self.assertTrue(Player.objects.get(pk=game.now_turn).owner)
+
+    @override_settings(GAMES_BOT_TIME_BUDGET=0.1)
+    def test_bot_moves_after_bulk(self):
+        """
+         - bot on turn after a sequence of moves made at once makes its move
+        """
+        staff = User.objects.create_user(username='bot_runner',
+                                         password='4567', is_staff=True)
+        client = self._client(staff)
+        game_id = client.post(
+            '/api/games/bulk/', {'pairs': [[self.player_1.pk, bot.get_bot().pk]]},
+            format='json',
+        ).json()[0]['id']
+
+        with events.subscribe(game_id) as subscription:
+            response = client.post('/api/games/{}/moves/bulk/'.format(game_id),
+                                   {'moves': [[7, 7], [0, 0], [7, 8]]},
+                                   format='json')
+            self.assertEqual(response.status_code, 200)
+            event = subscription.get(10)
+            while event is not None and event['type'] != 'move':
+                event = subscription.get(10)
+
+        self.assertIsNotNone(event)
+        self.assertEqual(event['symbol'], GUEST)
+        game = Game.objects.get(pk=game_id)
+        self.assertEqual(len(game.moves), 4)
+        self.assertTrue(Player.objects.get(pk=game.now_turn).owner)
+
+    @override_settings(GAMES_BOT_TIME_BUDGET=0.1, GAMES_BOT_RETRY_DELAY=0.01)
+    def test_bot_retries(self):
+        """
+         - move of the bot which failed is made again after a delay
+        """
+        client = self._client(self.player_1)
+        game_id = self._bot_game(client)
+        play = bot._Rules.play
+        calls = []
+
+        def fail_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return play(*args)
+
+        with mock.patch.object(bot._Rules, 'play', autospec=True,
+                               side_effect=fail_once), \
+                self.assertLogs('games.bot', 'WARNING') as logs:
+            event = self._bot_move(client, game_id)
+
+        self.assertIsNotNone(event)
+        self.assertEqual(len(calls), 2)
+        self.assertIn('retrying', logs.output[0])
+        game = Game.objects.get(pk=game_id)
+        self.assertTrue(Player.objects.get(pk=game.now_turn).owner)
+
+    @override_settings(GAMES_BOT_TIME_BUDGET=0.1)
+    def test_reschedule_bot_games(self):
+        """
+         - moves of the bot lost before they were made are made by the
+           command, games not waiting for the bot are left alone
+        """
+        client = self._client(self.player_1)
+        game_id = self._bot_game(client)
+        with mock.patch.object(bot, 'schedule'):
+            self._start_bot_game(client, game_id)
+        other_id = self._create_working_game(client,
+                                             self._client(self.player_2))
+        self.assertEqual(list(bot.waiting_games().values_list('id', flat=True)),
+                         [game_id])
+
+        moves = Move.objects.filter(game_id=game_id).count()
+        output = StringIO()
+        call_command('reschedule_bot_games', stdout=output)
+
+        self.assertIn('Moved in 1 of 1 games', output.getvalue())
+        game = Game.objects.get(pk=game_id)
+        self.assertEqual(Move.objects.filter(game=game).count(), moves + 1)
+        self.assertTrue(Player.objects.get(pk=game.now_turn).owner)
+        self.assertFalse(Move.objects.filter(game_id=other_id).exists())
+        self.assertFalse(bot.waiting_games().exists())
+
+    def test_parallel_matchmaking(self):
+        """
+         - users entering the queue at the same time are never paired twice
+         - every paired user gets the game he was paired for
+        """
+        users = [User.objects.create_user(username='user_{}'.format(i),
+                                          password='1234')
+                 for i in range(self.THREADS)]
+        clients = [self._client(user) for user in users]
+
+        self._in_parallel([
+            lambda client=client: client.post('/api/games/match/', {})
+            for client in clients
+        ])
+        for client in clients:
+            client.get('/api/games/match/')
+
+        players = Player.objects.filter(user__in=users)
+        self.assertEqual(players.count(),
+                         len(set(players.values_list('user_id', flat=True))))
+        for game in Game.objects.filter(player__user__in=users).distinct():
+            self.assertEqual(game.player_set.count(), 2)
+            self.assertTrue(game.started)
+        self.assertFalse(MatchTicket.objects.exclude(game=None).exists())
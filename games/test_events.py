@@ -0,0 +1,63 @@
+from threading import Timer
+from time import monotonic
+
+from django.test import SimpleTestCase
+
+from games import events
+
+
+class EventsTestCase(SimpleTestCase):
+    def test_wait_woken_by_publish(self):
+        """
+         - request waiting for a new version is woken up when the version is
+           published, before the database is polled again
+         - nobody is left waiting afterwards
+        """
+        versions = [1]
+        Timer(0.1, lambda: (versions.append(2), events.publish(7, {'version': 2}))).start()
+
+        start = monotonic()
+        version = events.wait_for_version(7, 1, 5, lambda: versions[-1])
+
+        self.assertEqual(version, 2)
+        self.assertLess(monotonic() - start, events.POLL_INTERVAL)
+        self.assertNotIn(7, events.get_backend()._subscriptions)
+
+    def test_wait_timeout(self):
+        """
+         - waiting ends with the unchanged version after the timeout
+         - missing game ends the waiting at once
+        """
+        self.assertEqual(events.wait_for_version(7, 1, 0.05, lambda: 1), 1)
+        self.assertIsNone(events.wait_for_version(7, 1, 5, lambda: None))
+
+    def test_publish(self):
+        """
+         - published event is delivered to every subscriber of the game
+         - subscribers of other games get nothing
+         - closed subscription is removed from the backend
+        """
+        backend = events.LocalBackend()
+        first, second = backend.subscribe(1), backend.subscribe(1)
+        other = backend.subscribe(2)
+
+        backend.publish(1, {'version': 3})
+
+        self.assertEqual(first.get(0), {'version': 3})
+        self.assertEqual(second.get(0), {'version': 3})
+        self.assertIsNone(other.get(0))
+
+        for subscription in (first, second, other):
+            subscription.close()
+        self.assertEqual(backend._subscriptions, {})
+
+    def test_slow_subscriber(self):
+        """
+         - subscriber which does not keep up keeps only the latest events
+        """
+        backend = events.LocalBackend()
+        with backend.subscribe(1) as subscription:
+            for version in range(events.MAX_PENDING_EVENTS + 10):
+                backend.publish(1, {'version': version})
+
+            self.assertEqual(subscription.get(0), {'version': 10})
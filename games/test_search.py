@@ -0,0 +1,58 @@
+from random import Random
+from time import perf_counter
+
+from django.test import SimpleTestCase
+
+from games.board import pack_moves
+from games.search import CENTER, Search, best_move
+
+
+class SearchTestCase(SimpleTestCase):
+    def test_score_updates(self):
+        """
+         - score updated as stones are placed and taken back is the same as
+           the score of the whole position
+        """
+        rng = Random(0)
+        fields = rng.sample(range(225), 60)
+        search = Search()
+        for field in fields:
+            search.place(field)
+            self.assertEqual(search.evaluate(), search.scan())
+        for field in reversed(fields):
+            search.take_back(field)
+            self.assertEqual(search.evaluate(), search.scan())
+        self.assertEqual((search.score, search.hash), (0, 0))
+
+    def test_first_move(self):
+        """
+         - first move is in the center of the board
+        """
+        self.assertEqual(Search().best_move(0.1), CENTER)
+
+    def test_wins(self):
+        """
+         - bot completes its four instead of blocking the four of the opponent
+        """
+        moves = pack_moves([(7, 3), (0, 0), (7, 4), (0, 1), (7, 5), (0, 2),
+                            (7, 6), (0, 3)])
+        self.assertIn(best_move(moves, 0.5)[0], [(7, 2), (7, 7)])
+
+    def test_blocks(self):
+        """
+         - bot blocks the open four of the opponent
+        """
+        moves = pack_moves([(7, 3), (0, 0), (7, 4), (14, 14), (7, 5), (0, 14),
+                            (7, 6)])
+        self.assertIn(best_move(moves, 0.5)[0], [(7, 2), (7, 7)])
+
+    def test_time_budget(self):
+        """
+         - search stops soon after its time budget runs out
+         - it reaches at least some depth in the meantime
+        """
+        moves = pack_moves([(7, 7), (7, 8), (8, 8), (6, 6), (8, 7), (9, 8)])
+        start = perf_counter()
+        _, info = best_move(moves, 0.2)
+        self.assertLess(perf_counter() - start, 0.5)
+        self.assertGreaterEqual(info['depth'], 2)
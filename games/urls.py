@@ -5,8 +5,16 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.GameRecent.as_view(), name='game_list'),
+    url(r'^bulk/$', views.GameBulk.as_view(), name='game_bulk'),
+    url(r'^export/$', views.GameExport.as_view(), name='game_export'),
+    url(r'^match/$', views.GameMatch.as_view(), name='game_match'),
+    url(r'^openings/$', views.GameOpenings.as_view(), name='game_openings'),
+    url(r'^stats/$', views.GameStats.as_view(), name='game_stats'),
+    url(r'^positions/$', views.GamePositions.as_view(), name='game_positions'),
     url(r'^(?P<pk>[\d-]+)/moves/$', views.GameMoves.as_view(), name='game_moves'),
+    url(r'^(?P<pk>[\d-]+)/moves/bulk/$', views.GameMovesBulk.as_view(), name='game_moves_bulk'),
     url(r'^(?P<pk>[\d-]+)/moves/last/$', views.GameLastMove.as_view(), name='game_last_move'),
+    url(r'^(?P<pk>[\d-]+)/events/$', views.GameEvents.as_view(), name='game_events'),
     url(r'^(?P<pk>[\d-]+)/(?P<action>[\w]+)/$', views.GameAction.as_view(), name='game_action'),
     url(r'^(?P<pk>[\d-]+)$', views.GameDetail.as_view(), name='game_detail'),
 ]
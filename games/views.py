@@ -1,12 +1,50 @@
+import json
+import math
 from random import choice
 
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, IntegerField, When
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from . import const
-from .models import Game, Player, Move
-from .api.serializers import GameSerializer, PlayerSerializer, MoveSerializer
+from . import analytics, archive, board, bot, cache, const, events, export, matchmaking, openings, positions
+from .models import ArchivedGame, Game, Player, Move, MatchTicket
+from .api.serializers import GameSerializer, PlayerSerializer, MoveSerializer, LastMoveSerializer
+from .pagination import CursorLinkPagination
+from .rules import MoveRules
+
+User = get_user_model()
+
+TRUE_VALUES = ('1', 'true', 'True')
+
+
+def _bulk_create(model, objs):
+    """
+    `bulk_create` which sets primary keys of the created objects also on
+    databases not returning them (SQLite) - by reading the last created ones.
+
+    This assumes that SQLite serializes writers: once the insert is made, the
+    transaction of the request holds the write lock until it commits, so no
+    other request can create rows in between. It must run in a transaction
+    (the requests are atomic), and would not be safe on a database with
+    concurrent writers which does not return the keys either (MySQL).
+    """
+    objs = model.objects.bulk_create(objs)
+    if objs and objs[0].pk is None:
+        pks = model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(list(pks))):
+            obj.pk = pk
+    return objs
+
+
+def _compact(request):
+    """Whether client asked for the compact representation with `?compact=1`"""
+    return request.query_params.get('compact') in TRUE_VALUES
 
 
 class GameRecent(APIView):
@@ -18,23 +56,205 @@ class GameRecent(APIView):
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    def _filter(self, games, params):
+        if params.get('joinable') in TRUE_VALUES:
+            games = games.filter(started=False, players_count=1)
+        
+        if 'started' in params:
+            games = games.filter(started=params['started'] in TRUE_VALUES)
+        
+        if 'players_count' in params:
+            games = games.filter(players_count=int(params['players_count']))
+        
+        return games
+    
     def get(self, request):
-        games = Game.objects.all().filter(finished=False)
-        serializer = GameSerializer(games, many=True, context={'no_board': True})
+        try:
+            games = self._filter(Game.objects.with_players().filter(finished=False), request.query_params)
+        except ValueError:
+            return Response(const.ERROR_INVALID_FILTER, status=status.HTTP_400_BAD_REQUEST)
+        
+        paginator = CursorLinkPagination()
+        page = paginator.paginate_queryset(games, request, view=self)
+        serializer = GameSerializer(page, many=True, context={'no_board': True})
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class GameDetail(APIView):
-    def get(self, request, pk):
+class GameBulk(APIView):
+    """
+    Creates many started games at once, e.g. for tournaments of bots. The
+    first user of every pair is the owner of the game and moves first.
+    """
+    permission_classes = (IsAdminUser,)
+    
+    def _pairs(self, data):
+        """
+        :return: list of pairs of user ids, None if they are not valid
+        """
+        if not isinstance(data, dict):
+            return None
         try:
-            game = Game.objects.get(pk=pk)
-        except Game.DoesNotExist:
+            pairs = [(int(owner), int(guest)) for owner, guest in data.get('pairs')]
+        except (TypeError, ValueError):
+            return None
+        
+        if not 0 < len(pairs) <= const.BULK_MAX_GAMES or any(owner == guest for owner, guest in pairs):
+            return None
+        
+        user_ids = {pk for pair in pairs for pk in pair}
+        if User.objects.filter(pk__in=user_ids).count() != len(user_ids):
+            return None
+        
+        return pairs
+    
+    def post(self, request):
+        pairs = self._pairs(request.data)
+        if pairs is None:
+            return Response(const.ERROR_INVALID_PAIRS, status=status.HTTP_400_BAD_REQUEST)
+        
+        games = _bulk_create(Game, [Game(players_count=2, started=True) for _ in pairs])
+        players = _bulk_create(Player, [
+            Player(user_id=user_id, game=game, owner=owner, first=owner)
+            for game, pair in zip(games, pairs)
+            for user_id, owner in zip(pair, (True, False))
+        ])
+        
+        game_ids = [game.pk for game in games]
+        Game.objects.filter(pk__in=game_ids).update(now_turn=Case(
+            *[When(pk=game.pk, then=owner.pk) for game, owner in zip(games, players[::2])],
+            output_field=IntegerField()
+        ))
+        
+        serializer = GameSerializer(Game.objects.with_players().filter(pk__in=game_ids),
+                                    many=True, context={'no_board': True})
+        
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class GameMatch(APIView):
+    """
+    Matchmaking queue - instead of picking a game from the list, the user
+    waits until he is paired with another one, see `matchmaking`
+    """
+    def _poll(self, ticket):
+        game_id = matchmaking.poll(ticket)
+        if game_id is None:
+            return Response({}, status=status.HTTP_202_ACCEPTED)
+        
+        serializer = GameSerializer(Game.objects.with_players().get(pk=game_id))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request):
+        window = request.data.get('window')
+        try:
+            window = float(window) if window is not None else None
+        except (TypeError, ValueError):
+            return Response(const.ERROR_INVALID_WINDOW, status=status.HTTP_400_BAD_REQUEST)
+        
+        if window is not None and window < 0:
+            return Response(const.ERROR_INVALID_WINDOW, status=status.HTTP_400_BAD_REQUEST)
+        
+        return self._poll(matchmaking.enqueue(request.user, window))
+    
+    def get(self, request):
+        try:
+            ticket = MatchTicket.objects.get(user=request.user)
+        except MatchTicket.DoesNotExist:
+            return Response(const.ERROR_NOT_QUEUED, status=status.HTTP_404_NOT_FOUND)
+        
+        return self._poll(ticket)
+    
+    def delete(self, request):
+        if MatchTicket.objects.filter(user=request.user, game=None).delete()[0]:
+            return Response({}, status=status.HTTP_200_OK)
+        
+        if MatchTicket.objects.filter(user=request.user).exists():
+            # paired already, the game has to be picked up
+            return Response(const.ERROR_GAME_ACTIVE, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(const.ERROR_NOT_QUEUED, status=status.HTTP_404_NOT_FOUND)
+
+
+def _etag(version):
+    return '"{}"'.format(version)
+
+
+def _game_version(pk):
+    version = Game.objects.filter(pk=pk).values_list('version', flat=True).first()
+    if version is None:
+        version = ArchivedGame.objects.filter(pk=pk).values_list('version', flat=True).first()
+    return version
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class ConditionalGameView(APIView):
+    """
+    Base for views rendering the current state of a single game, which
+    support conditional requests with `If-None-Match` against the game version
+    sent in `ETag`, and long-polling with `?wait_for_version=<version>`.
+    """
+    def check_version(self, request, pk):
+        """
+        :return: response to send instead of rendering the game, None if the
+                 game should be rendered
+        """
+        wait_for = request.query_params.get('wait_for_version')
+        if wait_for is not None:
+            try:
+                wait_for = int(wait_for)
+                timeout = float(request.query_params.get('timeout', const.LONG_POLL_TIMEOUT))
+            except ValueError:
+                return Response(const.ERROR_INVALID_WAIT, status=status.HTTP_400_BAD_REQUEST)
+            # NaN would never run out
+            if not math.isfinite(timeout):
+                return Response(const.ERROR_INVALID_WAIT, status=status.HTTP_400_BAD_REQUEST)
+            timeout = min(max(timeout, 0), const.LONG_POLL_TIMEOUT)
+            
+            version = events.wait_for_version(int(pk), wait_for, timeout, lambda: _game_version(pk))
+        elif 'HTTP_IF_NONE_MATCH' in request.META:
+            version = _game_version(pk)
+        else:
+            return None
+        
+        if version is None:
             return Response({}, status=status.HTTP_404_NOT_FOUND)
+        
+        if (wait_for is not None and version <= wait_for) or \
+                request.META.get('HTTP_IF_NONE_MATCH') == _etag(version):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': _etag(version)})
+        
+        return None
+    
+    def versioned(self, response, version):
+        response['ETag'] = _etag(version)
+        return response
+
+
+class GameDetail(ConditionalGameView):
+    def get(self, request, pk):
+        response = self.check_version(request, pk)
+        if response is not None:
+            return response
+        
+        compact = _compact(request)
+        version = _game_version(pk)
+        data = cache.get('game', cache.game_key(pk, version, compact)) if version is not None else None
+        
+        if data is None:
+            game = Game.objects.with_players().filter(pk=pk).first()
+            if game is not None:
+                data = GameSerializer(game, context={'compact': compact}).data
+            else:
+                game = ArchivedGame.objects.with_players().filter(pk=pk).first()
+                if game is None:
+                    return Response({}, status=status.HTTP_404_NOT_FOUND)
+                data = archive.game_data(game, compact)
             
-        serializer = GameSerializer(game)
+            version = game.version
+            cache.set(cache.game_key(pk, version, compact), data)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.versioned(Response(data, status=status.HTTP_200_OK), version)
 
 
 class GameAction(APIView):    
@@ -45,10 +265,11 @@ class GameAction(APIView):
         if user == owner.user:
             return const.ERROR_ALREADY_JOINED, status.HTTP_400_BAD_REQUEST
         
-        Player.objects.create(user=user, game=game)
-        
         game.players_count = 2
-        game.save()
+        if not game.save_if_unchanged(['players_count'], 'join'):
+            return const.ERROR_CONFLICT, status.HTTP_409_CONFLICT
+        
+        Player.objects.create(user=user, game=game)
         
         serializer = GameSerializer(game)
         return serializer.data, status.HTTP_200_OK
@@ -57,29 +278,42 @@ class GameAction(APIView):
             
         if user in [player.user for player in game.player_set.iterator()] and not game.started and game.players_count == 2:
             player = choice([owner, guest])
-            player.first = True
-            player.save()
             
             game.started = True
             game.now_turn = player.pk
-            game.save()
+            game.owner_first = player.owner
+            if not game.save_if_unchanged(['started', 'now_turn', 'owner_first'], 'start'):
+                return const.ERROR_CONFLICT, status.HTTP_409_CONFLICT
+            
+            player.first = True
+            player.save(update_fields=['first'])
+            bot.schedule(game, player)
             
             serializer = GameSerializer(game)
             return serializer.data, status.HTTP_200_OK
     
+    def _bot(self, user, game, owner, guest):
+        """Invites the bot to the game of the user, as its guest"""
+        if user != owner.user:
+            return const.ERROR_NOT_IN_GAME, status.HTTP_400_BAD_REQUEST
+        
+        return self._join(bot.get_bot(), game, owner, guest)
+    
     def _leave(self, user, game, owner, guest):
         if user in [player.user for player in game.player_set.iterator()]:
             if game.started is False:
-                player = user.player_set.get()
+                player = owner if user == owner.user else guest
+                
+                game.players_count = 1
+                if not game.save_if_unchanged(['players_count'], 'leave'):
+                    return const.ERROR_CONFLICT, status.HTTP_409_CONFLICT
                 
                 if player == owner:
                     guest.owner = True
-                    guest.save()
+                    guest.save(update_fields=['owner'])
                 
                 player.delete()
                 
-                game.players_count = 1
-                game.save()
                 return {}, status.HTTP_200_OK
             else:
                 return const.ERROR_GAME_ACTIVE, status.HTTP_400_BAD_REQUEST
@@ -91,20 +325,16 @@ class GameAction(APIView):
             if user in [owner.user, guest.user]:
                 winner, loser = ((owner, guest), (guest, owner))[user == owner.user]
                 
-                winner.user.won += 1
-                winner.user.won_by_surrender += 1
-                winner.user.save()
-
-                loser.user.lost += 1
-                loser.user.surrendered += 1
-                loser.user.save()
-                
-                winner.won = True
-                winner.save()
-                
                 game.finished = True
                 game.surrendered = True
-                game.save()
+                if not game.save_if_unchanged(['finished', 'surrendered'], 'surrender'):
+                    return const.ERROR_CONFLICT, status.HTTP_409_CONFLICT
+                
+                User.objects.record_win(winner.user_id, loser.user_id, surrender=True)
+                
+                winner.won = True
+                winner.save(update_fields=['won'])
+                openings.record(game.moves, openings.winner_side(game.owner_first, winner.owner))
                 
                 return {}, status.HTTP_200_OK
             else:
@@ -114,7 +344,8 @@ class GameAction(APIView):
         ACTIONS = {'join': self._join,
                    'start': self._start,
                    'leave': self._leave,
-                   'surrender': self._surrender
+                   'surrender': self._surrender,
+                   'bot': self._bot,
                    }
 
         try:
@@ -145,106 +376,75 @@ class GameAction(APIView):
         return Response({}, status=status.HTTP_404_NOT_FOUND)
         
 
-class GameMoves(APIView):
-    def _get_second_player(self, game, player):
-        players = list(game.player_set.iterator())
-        players.remove(player)
-        return players[0]
-        
-    def _make_move(self, x, y, game, player):
-        other = self._get_second_player(game, player)
-        if player.owner:
-            SYMBOL = const.OWNER
-        else:
-            SYMBOL = const.GUEST
-        
-        game.board[x][y] = SYMBOL
-        game.now_turn = other.pk
-        game.save()
+class GameMoves(MoveRules, APIView):
+    def _compact_response(self, game, move):
+        """Describes the move and the state of the game after it, without the board"""
+        return {'id': move.pk,
+                'x': move.x,
+                'y': move.y,
+                'symbol': game.board.get(move.x, move.y),
+                'now_turn': game.now_turn,
+                'version': game.version,
+                'finished': game.finished,
+                'draw': game.draw}
     
-    def _check_winning_conditions(self, game, player):
-        other = self._get_second_player(game, player)
-
-        # win
-        verticals = [[row[i] for row in game.board] for i in range(15)]
-        diagonals1 = [[game.board[j][i+j] for j in range(15-i)] for i in range(11)] + \
-                     [[game.board[i+j][j] for j in range(15-i)] for i in range(1, 11)]
-        diagonals2 = [[game.board[i-j][j] for j in range(i+1)] for i in range(4, 15)] + \
-                     [[game.board[14-j][i+j] for j in range(15-i)] for i in range(1, 11)]
-                     
-        for row in game.board + verticals + diagonals1 + diagonals2:
-            for i in range(11):
-                if row[i:i+5] in [list('o'*5), list('g'*5)]:
-                    
-                    player.user.won += 1
-                    player.user.save()
-
-                    player.won = True
-                    player.save()
-                    
-                    other.user.lost += 1
-                    other.user.save()
-                    
-                    game.finished = True
-                    game.save()
-                    
-                    return True
-
-        # draw
-        if all(all(row) for row in game.board):
-            other = self._get_second_player(game, player)
-            
-            player.user.draws += 1
-            player.user.save()
-            
-            other.user.draws += 1
-            other.user.save()
-            
-            game.finished = True
-            game.draw = True
-            game.save()
-            
-            return True
-                
-        return False
-        
     def get(self, request, pk):
-        game = Game.objects.get(pk=pk)
+        try:
+            game = Game.objects.get(pk=pk)
+        except Game.DoesNotExist:
+            game = ArchivedGame.objects.filter(pk=pk).first()
+            if game is None:
+                return Response({}, status=status.HTTP_404_NOT_FOUND)
+            return Response(archive.moves_data(game), status=status.HTTP_200_OK)
+        
         moves = Move.objects.all().filter(game=game)
         
         serializer = MoveSerializer(moves, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def post(self, request, pk):
-        game = Game.objects.get(pk=pk)
-        player = request.user.player_set.filter(game=game)
+        try:
+            game = Game.objects.with_players().get(pk=pk)
+        except Game.DoesNotExist:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        players = list(game.player_set.all())
+        player = next((p for p in players if p.user_id == request.user.pk), None)
                 
-        if not player:
+        if player is None:
             return Response(const.ERROR_NOT_IN_GAME, status=status.HTTP_400_BAD_REQUEST)
         
         if not game.started:
             return Response(const.ERROR_GAME_NOT_ACTIVE, status=status.HTTP_400_BAD_REQUEST)
         
-        player = player.get()
+        other = next(p for p in players if p is not player)
                 
         if player.pk == game.now_turn:
             x = int(request.data.get('x'))
             y = int(request.data.get('y'))
-            try:
-                if game.board[x][y]:
-                    return Response(const.ERROR_SPOT_TAKEN, status=status.HTTP_400_BAD_REQUEST)
-            except IndexError:
+            if not board.in_bounds(x, y):
                 return Response(const.ERROR_INVALID_MOVE, status=status.HTTP_400_BAD_REQUEST)
+            if not game.board.is_free(x, y):
+                return Response(const.ERROR_SPOT_TAKEN, status=status.HTTP_400_BAD_REQUEST)
             
             data = {'x': x,
                     'y': y,
                     'player': player.pk}
             
-            move = MoveSerializer(data=data, context={'player': player.pk, 'game': game.pk})
+            move = MoveSerializer(data=data, context={'player': player, 'game': game})
             if move.is_valid():
                 move.save()
-                self._make_move(x, y, game, player)
-                self._check_winning_conditions(game, player)
+                if not self._save_move(game, player, other, move.instance):
+                    transaction.set_rollback(True)
+                    return Response(const.ERROR_CONFLICT, status=status.HTTP_409_CONFLICT)
+                
+                if game.finished:
+                    self._update_statistics(game, player, other)
+                else:
+                    bot.schedule(game, other)
+                
+                if _compact(request):
+                    return Response(self._compact_response(game, move.instance), status=status.HTTP_200_OK)
                 
                 serializer = GameSerializer(game)
                 
@@ -258,12 +458,226 @@ class GameMoves(APIView):
         return Response({}, status=status.HTTP_404_NOT_FOUND)
 
 
-class GameLastMove(APIView):
+class GameLastMove(ConditionalGameView):
     def get(self, request, pk):
-        game = Game.objects.get(pk=pk)
-        moves = Move.objects.all().filter(game=game)
+        response = self.check_version(request, pk)
+        if response is not None:
+            return response
         
-        serializer = MoveSerializer(moves.first())
+        try:
+            game = Game.objects.only('version', *Game.LAST_MOVE_FIELDS).get(pk=pk)
+        except Game.DoesNotExist:
+            game = ArchivedGame.objects.filter(pk=pk).first()
+            if game is None:
+                return Response({}, status=status.HTTP_404_NOT_FOUND)
+            moves = archive.moves_data(game)
+            data = moves[0] if moves else MoveSerializer(None).data
+            return self.versioned(Response(data, status=status.HTTP_200_OK), game.version)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if game.moves_count:
+            serializer = LastMoveSerializer(game)
+        else:
+            serializer = MoveSerializer(None)
+        
+        return self.versioned(Response(serializer.data, status=status.HTTP_200_OK), game.version)
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class GameEvents(APIView):
+    """
+    Stream of changes of the game as server-sent events. It starts with the
+    current state of the game and ends after the game is finished.
+    """
+    def _format(self, event):
+        return 'id: {}\nevent: {}\ndata: {}\n\n'.format(event['version'], event['type'], json.dumps(event))
+    
+    def _stream(self, pk):
+        with events.subscribe(pk) as subscription:
+            # read after subscribing, so that no change is missed
+            game = Game.objects.get(pk=pk)
+            yield self._format(game.event('state'))
+            
+            finished = game.finished
+            while not finished:
+                event = subscription.get(const.EVENTS_KEEPALIVE)
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif event['version'] > game.version:
+                    yield self._format(event)
+                    finished = event['finished']
     
+    def get(self, request, pk):
+        if not Game.objects.filter(pk=pk).exists():
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+        
+        response = StreamingHttpResponse(self._stream(int(pk)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # disables buffering by nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class GameExport(APIView):
+    """
+    Streams all finished games with their moves as JSON lines, or in the
+    binary format with `?binary=1` - see `games.export`
+    """
+    permission_classes = (IsAdminUser,)
+    
+    def get(self, request):
+        binary = request.query_params.get('binary') in TRUE_VALUES
+        content_type = 'application/octet-stream' if binary else 'application/x-ndjson'
+        
+        response = StreamingHttpResponse(export.export(binary), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="games.{}"'.format('bin' if binary else 'jsonl')
+        return response
+
+
+class GameStats(APIView):
+    """
+    Statistics of all the finished games, from their latest snapshot - see
+    `games.analytics`
+    """
+    def get(self, request):
+        data = analytics.latest()
+        if data is None:
+            return Response(const.ERROR_NO_STATS, status=status.HTTP_404_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class GameOpenings(APIView):
+    """
+    Moves played in the position after given `?moves=` - x and y of every
+    move separated by commas - in the first moves of finished games, see
+    `games.openings`
+    """
+    def get(self, request):
+        try:
+            coordinates = [int(c) for c in request.query_params.get('moves', '').split(',') if c]
+        except ValueError:
+            coordinates = [None]
+        moves = list(zip(coordinates[::2], coordinates[1::2]))
+        if len(coordinates) % 2 or len(set(moves)) != len(moves) or \
+                not all(board.in_bounds(x, y) for x, y in moves):
+            return Response(const.ERROR_INVALID_POSITION, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(openings.explore(moves), status=status.HTTP_200_OK)
+
+
+class GamePositions(APIView):
+    """
+    Finds games which reached the position after given `moves`, or on given
+    `board` - also rotated or reflected, see `games.positions`
+    """
+    MAX_LIMIT = 200
+    
+    def _hashes(self, data):
+        """
+        :return: list of canonical hashes of the position, None if it is not
+                 valid
+        """
+        if 'moves' in data:
+            try:
+                moves = [(int(x), int(y)) for x, y in data['moves']]
+            except (TypeError, ValueError):
+                return None
+            position = positions.moves_hash(moves)
+            return None if position is None else [position]
+        
+        board_ = data.get('board')
+        fields = board.BOARD_SIZE * board.BOARD_SIZE
+        symbols = (const.OWNER, const.GUEST)
+        if isinstance(board_, str) and len(board_) == fields and \
+                set(board_) <= set(symbols + (board.FREE,)):
+            board_ = board.BitBoard.from_string(board_)
+        elif isinstance(board_, list) and len(board_) == board.BOARD_SIZE and \
+                all(isinstance(row, list) and len(row) == board.BOARD_SIZE and
+                    all(symbol in symbols + (None,) for symbol in row) for row in board_):
+            board_ = board.BitBoard.from_list(board_)
+        else:
+            return None
+        return positions.board_hashes(board_) or None
+    
+    def post(self, request):
+        hashes = self._hashes(request.data)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), self.MAX_LIMIT)
+        except ValueError:
+            hashes = None
+        if hashes is None:
+            return Response(const.ERROR_INVALID_POSITION, status=status.HTTP_400_BAD_REQUEST)
+        
+        found = positions.find(hashes, limit)
+        ids = [pk for pk, _ in found]
+        hot = list(Game.objects.with_players().filter(pk__in=ids))
+        serialized = GameSerializer(hot, many=True, context={'no_board': True}).data
+        games = {game.pk: data for game, data in zip(hot, serialized)}
+        for game in ArchivedGame.objects.with_players().filter(pk__in=set(ids) - set(games)):
+            games[game.pk] = archive.game_data(game, no_board=True)
+        
+        return Response([{'ply': ply, 'game': games[pk]} for pk, ply in found if pk in games],
+                        status=status.HTTP_200_OK)
+
+
+class GameMovesBulk(MoveRules, APIView):
+    """
+    Makes a whole sequence of moves at once, for trusted bots. The moves are
+    checked with the same rules as when made one by one, then saved with a
+    single insert and a single update of the game.
+    """
+    permission_classes = (IsAdminUser,)
+    
+    def _invalid(self, error, i):
+        """Error response pointing at the i-th of the posted moves"""
+        return Response(dict(error, move=i), status=status.HTTP_400_BAD_REQUEST)
+    
+    def post(self, request, pk):
+        moves = None
+        if isinstance(request.data, dict):
+            try:
+                moves = [(int(x), int(y)) for x, y in request.data.get('moves')]
+            except (TypeError, ValueError):
+                pass
+        
+        if not moves:
+            return Response(const.ERROR_INVALID_MOVE, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            game = Game.objects.with_players().get(pk=pk)
+        except Game.DoesNotExist:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+        
+        players = {player.pk: player for player in game.player_set.all()}
+        indexed = len(game.moves)
+        made = []
+        for i, (x, y) in enumerate(moves):
+            if not game.started or game.finished:
+                return self._invalid(const.ERROR_GAME_NOT_ACTIVE, i)
+            if not board.in_bounds(x, y):
+                return self._invalid(const.ERROR_INVALID_MOVE, i)
+            if not game.board.is_free(x, y):
+                return self._invalid(const.ERROR_SPOT_TAKEN, i)
+            
+            player = players[game.now_turn]
+            other = next(p for p in players.values() if p is not player)
+            made.append(Move(player_id=player.pk, game_id=game.pk, x=x, y=y))
+            self._make_move(x, y, game, player, other)
+            self._check_winning_conditions(game, player, x, y)
+        
+        _bulk_create(Move, made)
+        game.moves_count += len(made) - 1
+        game.set_last_move(made[-1])
+        event = {'type': 'moves', 'moves': [[move.x, move.y] for move in made]}
+        if not game.save_if_unchanged(self.SAVED_FIELDS, event):
+            transaction.set_rollback(True)
+            return Response(const.ERROR_CONFLICT, status=status.HTTP_409_CONFLICT)
+        positions.record(game.pk, game.moves, indexed)
+        
+        if game.finished:
+            self._update_statistics(game, player, other)
+        else:
+            bot.schedule(game, other)
+        
+        serializer = GameSerializer(game)
+        return Response({'game': serializer.data}, status=status.HTTP_200_OK)
@@ -84,9 +84,27 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
         'ATOMIC_REQUESTS': True,
+        # a file rather than the shared in-memory database, which locks
+        # whole tables, so concurrent requests in the tests behave as served
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     },
 }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# Local memory is kept per process, share it between the processes with
+# e.g. 'django.core.cache.backends.memcached.PyLibMCCache' or a redis backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Cache of serialized games and users, see games.cache
+GAMES_CACHE = 'default'
+GAMES_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -128,6 +146,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'EXCEPTION_HANDLER': 'games.exceptions.exception_handler',
     # 'DEFAULT_AUTHENTICATION_CLASSES': (
     #     'user.authentication.CsrfExemptSessionAuthentication',
     # ),
@@ -137,3 +156,14 @@ REST_FRAMEWORK = {
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
 AUTH_USER_MODEL = 'user.User'
+
+# Publish/subscribe backend pushing changes of games to waiting clients
+GAMES_EVENTS_BACKEND = 'games.events.LocalBackend'
+
+# Built-in bot - processes searching its moves, and seconds each search may take
+GAMES_BOT_WORKERS = 2
+GAMES_BOT_TIME_BUDGET = 1.0
+# Attempts to make a failed move again, and seconds before the first of them,
+# doubled for each next one
+GAMES_BOT_RETRIES = 3
+GAMES_BOT_RETRY_DELAY = 1.0
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
+from games import cache
+from games.models import ArchivedGame, Game
+
 from ..models import User
 
 
@@ -14,9 +17,24 @@ class UserSerializer(serializers.ModelSerializer):
     
     def update(self, user, data):
         user.username = data.get('username', user.username)
-        user.save()
+        # statistics are incremented in the database, saving the whole
+        # loaded user would overwrite them
+        user.save(update_fields=['username'])
+        
+        # the username is also shown in the games of the user
+        cache.invalidate_users(user.pk)
+        cache.invalidate_games(Game.objects.filter(player__user=user).values_list('id', 'version'))
+        cache.invalidate_games(ArchivedGame.objects.filter(players__user=user).values_list('id', 'version'))
         return user
         
     class Meta:
         model = User
         fields = ('username', 'password', 'won', 'lost', 'won_by_surrender', 'draws', 'surrendered')
+
+
+class LeaderboardSerializer(serializers.ModelSerializer):
+    rank = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'rank', 'score', 'rating', 'won', 'lost', 'draws')
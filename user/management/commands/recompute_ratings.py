@@ -0,0 +1,117 @@
+from heapq import merge
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, When
+
+from games import archive
+from games.models import ArchivedGame, Game, Player
+from user.rating import DRAW, INITIAL_RATING, LOSS, WIN, rating_changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes ratings of all users by replaying finished games, the '
+        'hot and the archived ones, in the order they were finished. Games '
+        'are read in batches, so memory does not grow with the number of '
+        'games. Run it while no games are being finished, as their rating '
+        'changes would be overwritten.'
+    )
+
+    def add_arguments(self, parser):
+        # SQLite allows at most 999 parameters in a query
+        parser.add_argument('--batch-size', type=int, default=900,
+                            help='Number of games read at once')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        ratings = {}
+        games_count = 0
+
+        # both are ordered by (last_activity, id)
+        for _, _, draw, players in merge(self._finished_games(),
+                                         self._archived_games()):
+            if len(players) != 2:
+                continue
+            (user_id, won), (other_id, _) = players
+            change, other_change = rating_changes(
+                ratings.get(user_id, INITIAL_RATING),
+                ratings.get(other_id, INITIAL_RATING),
+                DRAW if draw else WIN if won else LOSS,
+            )
+            ratings[user_id] = ratings.get(user_id, INITIAL_RATING) + change
+            ratings[other_id] = \
+                ratings.get(other_id, INITIAL_RATING) + other_change
+            games_count += 1
+
+        with transaction.atomic():
+            self._save(ratings)
+
+        self.stdout.write('Replayed {} games of {} users.'.format(
+            games_count, len(ratings)))
+
+    def _batches(self, queryset, *fields):
+        """
+        Yields lists of (last_activity, id, *fields) of given games, batch by
+        batch in the order the games were finished
+        """
+        rows = queryset.order_by('last_activity', 'id') \
+            .values_list('last_activity', 'id', *fields)
+        batch = list(rows[:self.batch_size])
+        while batch:
+            yield batch
+
+            last_activity, pk = batch[-1][:2]
+            # a range on the index rather than an OR of two conditions, which
+            # SQLite would scan the whole index for
+            batch = list(
+                rows.filter(last_activity__gte=last_activity)
+                .exclude(last_activity=last_activity, id__lte=pk)
+                [:self.batch_size]
+            )
+
+    def _finished_games(self):
+        """
+        Yields finished games as (last_activity, id, draw, players) - players
+        as pairs (user id, won) - in the order the games were finished
+        """
+        # unfinished games are skipped here rather than in the query, so that
+        # games are read along the index on `last_activity`
+        for batch in self._batches(Game.objects.all(), 'draw', 'finished'):
+            players = {}
+            for game_id, user_id, won in Player.objects.filter(
+                    game_id__in=[row[1] for row in batch if row[3]]) \
+                    .values_list('game_id', 'user_id', 'won'):
+                players.setdefault(game_id, []).append((user_id, won))
+
+            for last_activity, pk, draw, finished in batch:
+                if finished:
+                    yield last_activity, pk, draw, players.get(pk, [])
+
+    def _archived_games(self):
+        """`_finished_games` of the archive"""
+        for batch in self._batches(ArchivedGame.objects.all(), 'data'):
+            for last_activity, pk, data in batch:
+                game = archive.game_record(ArchivedGame(data=data))
+                yield last_activity, pk, game['draw'], [
+                    (player['user'], player['won'])
+                    for player in game['players']
+                ]
+
+    def _save(self, ratings):
+        user_model = get_user_model()
+        user_model.objects.update(rating=INITIAL_RATING)
+
+        # three parameters per user
+        chunk_size = max(self.batch_size // 3, 1)
+        ratings = iter(ratings.items())
+        chunk = list(islice(ratings, chunk_size))
+        while chunk:
+            user_model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                rating=Case(*[When(pk=pk, then=rating)
+                              for pk, rating in chunk],
+                            output_field=models.FloatField())
+            )
+            chunk = list(islice(ratings, chunk_size))
@@ -0,0 +1,9 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Sets leaderboard score of all users from their statistics.'
+
+    def handle(self, *args, **options):
+        get_user_model().objects.recompute_scores()
@@ -1,5 +1,113 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Case, F, Q, When
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+
+from games import cache
+from .rating import DRAW, INITIAL_RATING, WIN, rating_changes
+
+# Leaderboard points for each result, added to `User.score`
+SCORE_POINTS = {'won': 3, 'draws': 1}
+
+
+def _score(**values):
+    """
+    Expression of the score computed from the statistics of a user
+    :param values: values of the statistics replacing the stored ones
+    """
+    return sum(values.get(name, F(name)) * points
+               for name, points in SCORE_POINTS.items())
+
+
+def _add(field, changes, output_field):
+    """Expression adding the change for the given user to the field"""
+    return Case(
+        *[When(pk=pk, then=F(field) + change)
+          for pk, change in changes.items() if change],
+        default=F(field),
+        output_field=output_field
+    )
+
+
+class UserManager(BaseUserManager):
+    def _increment(self, increments, ratings=None):
+        """
+        Increments statistics of many users at once, with a single
+        `UPDATE ... SET field = field + 1` statement. The score of the users
+        is updated along.
+        :param increments: dict mapping user id to names of the fields to
+                           increment
+        :param ratings: dict mapping user id to change of his rating
+        """
+        fields = {name for names in increments.values() for name in names}
+        values = {
+            name: _add(name, {pk: 1 for pk, names in increments.items()
+                              if name in names}, models.IntegerField())
+            for name in fields
+        }
+        points = {pk: sum(SCORE_POINTS.get(name, 0) for name in names)
+                  for pk, names in increments.items()}
+        if any(points.values()):
+            values['score'] = _add('score', points, models.IntegerField())
+        if ratings:
+            values['rating'] = _add('rating', ratings, models.FloatField())
+        self.filter(pk__in=increments.keys()).update(**values)
+        cache.invalidate_users(*increments)
+
+    def _rating_changes(self, user_id, other_id, score):
+        """
+        Computes changes of ratings of two users after a game between them.
+        The changes are added to the ratings rather than overwriting them, so
+        a game of either user finished at the same time is not lost.
+        :param score: result of the first user - `WIN` or `DRAW`
+        """
+        ratings = dict(self.filter(pk__in=(user_id, other_id))
+                       .values_list('pk', 'rating'))
+        changes = rating_changes(ratings[user_id], ratings[other_id], score)
+        return dict(zip((user_id, other_id), changes))
+
+    def record_win(self, winner_id, loser_id, surrender=False):
+        """Counts game won by one user and lost by the other"""
+        ratings = self._rating_changes(winner_id, loser_id, WIN)
+        if surrender:
+            self._increment({winner_id: ('won', 'won_by_surrender'),
+                             loser_id: ('lost', 'surrendered')}, ratings)
+        else:
+            self._increment({winner_id: ('won',), loser_id: ('lost',)},
+                            ratings)
+
+    def record_draw(self, user_id, other_id):
+        """Counts draw for both users"""
+        ratings = self._rating_changes(user_id, other_id, DRAW)
+        self._increment({user_id: ('draws',), other_id: ('draws',)}, ratings)
+
+    def recompute_scores(self):
+        """Sets score of all users from their statistics"""
+        self.update(score=_score())
+
+    def set_statistics(self, pk, stored, values):
+        """
+        Sets statistics of the user, and the score along, only if they still
+        hold the stored values
+        :param stored: dict of the expected current values of the statistics
+        :param values: dict of their new values
+        :return: False if the statistics changed in the meantime
+        """
+        updated = self.filter(pk=pk, **stored).update(score=_score(**values),
+                                                      **values)
+        if updated:
+            cache.invalidate_users(pk)
+        return bool(updated)
+
+    def rank(self, user, by='score'):
+        """
+        Returns position of the user on the leaderboard - one more than the
+        number of users ranked higher, counted on the index
+        :param by: `score` or `rating`, see `User.RANKINGS`
+        """
+        value = getattr(user, by)
+        return self.filter(
+            Q(**{by + '__gt': value}) | Q(**{by: value, 'pk__lt': user.pk})
+        ).count() + 1
 
 
 class User(AbstractUser):
@@ -8,3 +116,25 @@ class User(AbstractUser):
     won_by_surrender = models.IntegerField(default=0)
     draws = models.IntegerField(default=0)
     surrendered = models.IntegerField(default=0)
+
+    # Leaderboard points, see `SCORE_POINTS`
+    score = models.IntegerField(default=0)
+    # Elo rating, see `user.rating`
+    rating = models.FloatField(default=INITIAL_RATING)
+    # The built-in bot, see `games.bot`
+    is_bot = models.BooleanField(default=False)
+
+    objects = UserManager()
+
+    # Orderings of the leaderboard, users with equal score or rating are
+    # ranked by the time they joined
+    RANKINGS = {
+        'score': ('-score', 'id'),
+        'rating': ('-rating', 'id'),
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='user_score_idx'),
+            models.Index(fields=['-rating', 'id'], name='user_rating_idx'),
+        ]
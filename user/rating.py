@@ -0,0 +1,28 @@
+"""
+Elo rating of players, updated when a game between them is finished.
+"""
+INITIAL_RATING = 1500.0
+
+# Maximum change of the rating after a single game
+K_FACTOR = 32
+
+WIN = 1.0
+DRAW = 0.5
+LOSS = 0.0
+
+
+def expected_score(rating, other_rating):
+    """Expected score of the player against the other one, from 0 to 1"""
+    return 1 / (1 + 10 ** ((other_rating - rating) / 400))
+
+
+def rating_changes(rating, other_rating, score):
+    """
+    Returns changes of ratings of both players after a game
+    :param rating: rating of the player
+    :param other_rating: rating of his opponent
+    :param score: result of the player - `WIN`, `DRAW` or `LOSS`
+    :return: tuple with changes of the player's and the opponent's rating
+    """
+    change = K_FACTOR * (score - expected_score(rating, other_rating))
+    return change, -change
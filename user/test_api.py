@@ -1,5 +1,15 @@
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase, APIClient
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
+
+from games import archive, cache
+from games.models import Game, Player
+from user.rating import INITIAL_RATING
+from user.api.serializers import UserSerializer
 
 User = get_user_model()
 
@@ -10,6 +20,7 @@ class UserAPITestCase(APITestCase):
         super().setUpClass()
 
     def setUp(self):
+        cache.get_cache().clear()
         self._test_user_dict = dict(username='test_user', password='test123')
         User.objects.create_user(**self._test_user_dict)
         self.api_client = APIClient()
@@ -134,6 +145,37 @@ class UserAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), [])
 
+    def test_my_games_queries(self):
+        """
+         - games of the user are listed most recently active first
+         - finished games are filtered by the database
+         - number of queries does not depend on number of games
+        """
+        self._login()
+        self._create_other_user()
+        game_ids = [
+            self.api_client.post('/api/games/', {}).json()['id']
+            for _ in range(4)
+        ]
+        other_client = APIClient()
+        other_client.force_login(User.objects.get(pk=self.other_user_id))
+        other_client.post('/api/games/{}/join/'.format(game_ids[1]), {})
+        Game.objects.filter(pk__in=game_ids[2:]).update(finished=True)
+
+        # savepoint, session, user, games, players, archived games, release
+        with self.assertNumQueries(7):
+            response = self.api_client.get('/api/user/me/games/',
+                                           {'limit': 3})
+        self.assertEqual([game['id'] for game in response.json()],
+                         [game_ids[1], game_ids[3], game_ids[2]])
+        self.assertEqual(len(response.json()[0]['players']), 2)
+        self.assertIn('rel="next"', response['Link'])
+
+        with self.assertNumQueries(7):
+            response = self.api_client.get('/api/user/me/games/finished/')
+        self.assertEqual([game['id'] for game in response.json()],
+                         [game_ids[3], game_ids[2]])
+
     def test_info_about_some_user(self):
         """
          - user can obtain other user's statistics
@@ -162,3 +204,259 @@ class UserAPITestCase(APITestCase):
             '/api/user/{}'.format(1924503),
         )
         self.assertEqual(response.status_code, 404)
+
+    def test_record_results(self):
+        """
+         - game results are added to the statistics stored in the database,
+           both users are updated at once
+        """
+        self._create_other_user()
+        user_id = User.objects.get(username='test_user').id
+
+        # ratings, then all the statistics at once
+        with self.assertNumQueries(2):
+            User.objects.record_win(user_id, self.other_user_id)
+        User.objects.record_win(self.other_user_id, user_id, surrender=True)
+        User.objects.record_draw(user_id, self.other_user_id)
+
+        self.assertEqual(
+            User.objects.filter(pk=user_id).values(
+                'won', 'lost', 'won_by_surrender', 'draws', 'surrendered'
+            ).get(),
+            {'won': 1, 'lost': 1, 'won_by_surrender': 0, 'draws': 1,
+             'surrendered': 1},
+        )
+        self.assertEqual(
+            User.objects.filter(pk=self.other_user_id).values(
+                'won', 'lost', 'won_by_surrender', 'draws', 'surrendered'
+            ).get(),
+            {'won': 1, 'lost': 1, 'won_by_surrender': 1, 'draws': 1,
+             'surrendered': 0},
+        )
+
+    def test_rename_keeps_statistics(self):
+        """
+         - renaming a user loaded before a game ended keeps the result
+        """
+        self._create_other_user()
+        user = User.objects.get(username='test_user')
+        User.objects.record_win(user.pk, self.other_user_id)
+
+        serializer = UserSerializer(user, {'username': 'renamed'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        user.refresh_from_db()
+        self.assertEqual((user.username, user.won, user.score), ('renamed', 1, 3))
+
+    def test_leaderboard(self):
+        """
+         - score is updated along the statistics
+         - users are ranked by score, ties by the time they joined
+         - leaderboard is paginated, every page costs the same queries
+         - user can get his own rank
+        """
+        users = [User.objects.get(username='test_user')] + [
+            User.objects.create_user(username='user_{}'.format(i),
+                                     password='1234')
+            for i in range(4)
+        ]
+        User.objects.record_win(users[2].pk, users[0].pk)
+        User.objects.record_draw(users[3].pk, users[0].pk)
+        User.objects.record_win(users[3].pk, users[1].pk, surrender=True)
+        self._login()
+
+        # savepoint, session, user, users, rank of the first, release
+        with self.assertNumQueries(6):
+            response = self.api_client.get('/api/user/leaderboard/',
+                                           {'limit': 2})
+        self.assertEqual(
+            [(user['username'], user['rank'], user['score'])
+             for user in response.json()],
+            [('user_2', 1, 4), ('user_1', 2, 3)],
+        )
+
+        next_url = response['Link'].split(';')[0].strip('<>')
+        with self.assertNumQueries(6):
+            response = self.api_client.get(next_url)
+        self.assertEqual(
+            [(user['username'], user['rank'], user['score'])
+             for user in response.json()],
+            [('test_user', 3, 1), ('user_0', 4, 0)],
+        )
+
+        response = self.api_client.get('/api/user/leaderboard/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['rank'], response.json()['score']),
+                         (3, 1))
+
+        User.objects.update(score=0)
+        User.objects.recompute_scores()
+        self.assertEqual(User.objects.get(pk=users[3].pk).score, 4)
+
+    def test_leaderboard_ties(self):
+        """
+         - pages of more users of the same score than a cursor can skip by an
+           offset list every user exactly once, in order of their ranks
+         - previous page is the same when paged back to
+        """
+        User.objects.bulk_create(User(username='user_{}'.format(i))
+                                 for i in range(1100))
+        self._login()
+
+        pages = []
+        url = '/api/user/leaderboard/'
+        params = {'limit': 200, 'by': 'rating'}
+        while url:
+            response = self.api_client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response)
+            links = dict(reversed(link.split('; ')) for link in
+                         response.get('Link', '').split(', ') if link)
+            url, params = links.get('rel="next"', '').strip('<>'), None
+
+        users = [user for page in pages for user in page.json()]
+        self.assertEqual([user['id'] for user in users],
+                         list(User.objects.order_by('id')
+                              .values_list('id', flat=True)))
+        self.assertEqual([user['rank'] for user in users],
+                         list(range(1, len(users) + 1)))
+
+        previous = pages[2]['Link'].split(', ')[1].split(';')[0].strip('<>')
+        self.assertEqual(self.api_client.get(previous).json(),
+                         pages[1].json())
+
+    def test_ratings(self):
+        """
+         - winner takes rating points from the loser
+         - draw moves ratings of the users towards each other
+         - leaderboard can be ordered by rating
+        """
+        self._create_other_user()
+        user_id = User.objects.get(username='test_user').id
+
+        User.objects.record_win(user_id, self.other_user_id)
+        ratings = dict(User.objects.values_list('id', 'rating'))
+        self.assertAlmostEqual(ratings[user_id], INITIAL_RATING + 16)
+        self.assertAlmostEqual(ratings[self.other_user_id],
+                               INITIAL_RATING - 16)
+
+        User.objects.record_draw(user_id, self.other_user_id)
+        ratings = dict(User.objects.values_list('id', 'rating'))
+        self.assertLess(ratings[user_id], INITIAL_RATING + 16)
+        self.assertAlmostEqual(ratings[user_id] + ratings[self.other_user_id],
+                               2 * INITIAL_RATING)
+
+        self._login()
+        response = self.api_client.get('/api/user/leaderboard/',
+                                       {'by': 'rating'})
+        self.assertEqual([user['id'] for user in response.json()],
+                         [user_id, self.other_user_id])
+        response = self.api_client.get('/api/user/leaderboard/me/',
+                                       {'by': 'rating'})
+        self.assertEqual(response.json()['rank'], 1)
+
+        response = self.api_client.get('/api/user/leaderboard/',
+                                       {'by': 'username'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_recompute_ratings(self):
+        """
+         - replaying finished games gives the ratings they gave when played,
+           whatever the batch size
+         - games not finished are skipped
+         - archived games are replayed in order with the others
+        """
+        self._create_other_user()
+        user_id = User.objects.get(username='test_user').id
+        results = [(user_id, False), (self.other_user_id, False),
+                   (user_id, True), (None, False)]
+
+        for winner_id, draw in results:
+            game = Game.objects.create(players_count=2, started=True,
+                                       finished=True, draw=draw)
+            Player.objects.create(user_id=user_id, game=game, owner=True,
+                                  won=winner_id == user_id)
+            Player.objects.create(user_id=self.other_user_id, game=game,
+                                  won=winner_id == self.other_user_id)
+            if draw:
+                User.objects.record_draw(user_id, self.other_user_id)
+            elif winner_id == user_id:
+                User.objects.record_win(user_id, self.other_user_id)
+            elif winner_id:
+                User.objects.record_win(self.other_user_id, user_id)
+            else:
+                Game.objects.filter(pk=game.pk).update(finished=False)
+
+        games = list(Game.objects.order_by('id').with_players())
+        archive.archive_games(games[::2])
+        expected = dict(User.objects.values_list('id', 'rating'))
+
+        for batch_size in (900, 1):
+            User.objects.update(rating=0)
+            call_command('recompute_ratings', batch_size=batch_size,
+                         stdout=StringIO())
+            ratings = dict(User.objects.values_list('id', 'rating'))
+            for pk, rating in expected.items():
+                self.assertAlmostEqual(ratings[pk], rating)
+
+
+class UserCacheTestCase(APITransactionTestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='test_user',
+                                             password='test123')
+        self.other = User.objects.create_user(username='other_user',
+                                              password='5432')
+        self.api_client = APIClient()
+        self.api_client.force_login(self.user)
+
+    def test_statistics_invalidated(self):
+        """
+         - cached user is served again until the statistics change
+         - changed statistics are served after the change is committed
+        """
+        url = '/api/user/{}'.format(self.other.pk)
+        self.assertEqual(self.api_client.get(url).json()['won'], 0)
+        self.assertEqual(self.api_client.get('/api/user/me/').json()['lost'],
+                         0)
+
+        cache.reset_stats()
+        self.api_client.get(url)
+        self.assertEqual(cache.stats(), {'user': {'hits': 1, 'misses': 0}})
+
+        User.objects.record_win(self.other.pk, self.user.pk)
+
+        self.assertEqual(self.api_client.get(url).json()['won'], 1)
+        self.assertEqual(self.api_client.get('/api/user/me/').json()['lost'],
+                         1)
+
+    def test_username_invalidated(self):
+        """
+         - changed username is shown in the cached games of the user, hot and
+           archived ones
+        """
+        archived = Game.objects.create(players_count=2, started=True,
+                                       finished=True, draw=True)
+        Player.objects.create(user=self.user, game=archived, owner=True)
+        Player.objects.create(user=self.other, game=archived)
+        Game.objects.filter(pk=archived.pk).update(
+            last_activity=timezone.now() - timedelta(days=31))
+        self.assertEqual(sum(archive.archive()), 1)
+
+        game_id = self.api_client.post('/api/games/', {}).json()['id']
+        urls = ['/api/games/{}'.format(pk) for pk in (game_id, archived.pk)]
+        for url in urls:
+            self.assertEqual(
+                self.api_client.get(url).json()['players'][0]['name'],
+                'test_user')
+
+        serializer = UserSerializer(self.user, {'username': 'renamed'},
+                                    partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        for url in urls:
+            self.assertEqual(
+                self.api_client.get(url).json()['players'][0]['name'],
+                'renamed')
@@ -10,5 +10,7 @@ urlpatterns = [
     url(r'^me/$', views.UserMe.as_view(), name='me'),
     url(r'^me/games/$', views.UserMeGames.as_view(), name='me_games'),
     url(r'^me/games/finished/$', views.UserMeFinishedGames.as_view(), name='me_finished_games'),
+    url(r'^leaderboard/$', views.UserLeaderboard.as_view(), name='leaderboard'),
+    url(r'^leaderboard/me/$', views.UserLeaderboardMe.as_view(), name='leaderboard_me'),
     url(r'^(?P<pk>[\d-]+)$', views.UserInfo.as_view(), name='user_info'),
 ]
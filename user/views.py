@@ -7,8 +7,11 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.views import logout
 
 from .models import User
-from .api.serializers import UserSerializer
+from .api.serializers import UserSerializer, LeaderboardSerializer
+from games import archive, cache, const
 from games.api.serializers import GameSerializer
+from games.models import ArchivedGame, Game
+from games.pagination import KeysetPagination, MergedQuerySet, RecentActivityPagination
 
 
 class UserRegister(APIView):
@@ -50,8 +53,9 @@ class UserLogout(APIView):
 
 class UserMe(APIView):
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = cache.get_or_build('user', cache.user_key(request.user.pk),
+                                  lambda: UserSerializer(request.user).data)
+        return Response(data, status=status.HTTP_200_OK)
     
     def patch(self, request):
         user = User.objects.get(username=request.data.get('username'))
@@ -60,28 +64,70 @@ class UserMe(APIView):
 
 
 class UserMeGames(APIView):
+    def get_games(self, request):
+        return Game.objects.filter(player__user=request.user)
+    
     def get(self, request):
-        games = [player.game for player in request.user.player_set.iterator()]
-        serializer = GameSerializer(games, many=True, context={'no_board': True})
+        # archived games are all finished, and listed along with the others
+        games = MergedQuerySet(self.get_games(request).with_players(),
+                               ArchivedGame.objects.filter(players__user=request.user).with_players())
+        paginator = RecentActivityPagination()
+        page = paginator.paginate_queryset(games, request, view=self)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serialized = iter(GameSerializer([game for game in page if isinstance(game, Game)],
+                                         many=True, context={'no_board': True}).data)
+        data = [next(serialized) if isinstance(game, Game) else archive.game_data(game, no_board=True)
+                for game in page]
+        
+        return paginator.get_paginated_response(data)
 
 
-class UserMeFinishedGames(APIView):
-    def get(self, request):
-        games = [player.game for player in request.user.player_set.iterator() if player.game.finished]
-        serializer = GameSerializer(games, many=True, context={'no_board': True})
-        
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class UserMeFinishedGames(UserMeGames):
+    def get_games(self, request):
+        return super().get_games(request).filter(finished=True)
 
 
 class UserInfo(APIView):
     def get(self, request, pk):
-        try:
-            user = User.objects.get(pk=pk)
-        except User.DoesNotExist:
-            return Response({}, status=status.HTTP_404_NOT_FOUND)
+        data = cache.get('user', cache.user_key(pk))
+        if data is None:
+            try:
+                user = User.objects.get(pk=pk)
+            except User.DoesNotExist:
+                return Response({}, status=status.HTTP_404_NOT_FOUND)
+            
+            data = UserSerializer(user).data
+            cache.set(cache.user_key(user.pk), data)
         
-        serializer = UserSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
 
+
+class UserLeaderboard(APIView):
+    def get(self, request):
+        by = request.query_params.get('by', 'score')
+        if by not in User.RANKINGS:
+            return Response(const.ERROR_INVALID_FILTER, status=status.HTTP_400_BAD_REQUEST)
+        
+        paginator = KeysetPagination()
+        paginator.ordering = User.RANKINGS[by]
+        page = paginator.paginate_queryset(User.objects.all(), request, view=self)
+        
+        if page:
+            first = User.objects.rank(page[0], by)
+            for rank, user in enumerate(page, first):
+                user.rank = rank
+        
+        serializer = LeaderboardSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class UserLeaderboardMe(APIView):
+    def get(self, request):
+        by = request.query_params.get('by', 'score')
+        if by not in User.RANKINGS:
+            return Response(const.ERROR_INVALID_FILTER, status=status.HTTP_400_BAD_REQUEST)
+        
+        request.user.rank = User.objects.rank(request.user, by)
+        serializer = LeaderboardSerializer(request.user)
+        
+        return Response(serializer.data, status=status.HTTP_200_OK)